@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from http import HTTPStatus
+
+logger = logging.getLogger(__name__)
+
+# ============================
+# RESPONSE ENCODING
+# ============================
+
+def encode_response(status, headers, body, keep_alive=True):
+    """Encode a full HTTP/1.1 response (status line, headers and body) to bytes."""
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    for name, value in headers:
+        lines.append(f"{name}: {value}")
+    lines.append(f"Content-Length: {len(body)}")
+    if not keep_alive:
+        lines.append("Connection: close")
+    head = "\r\n".join(lines) + "\r\n\r\n"
+    return head.encode('latin-1') + body
+
+def encode_chunk(data):
+    """Frame data as one Transfer-Encoding: chunked chunk. Empty data is the last chunk."""
+    return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+READ_SIZE = 64 * 1024  # Request bodies are read and handled in pieces of this size
+
+# ============================
+# ASYNCIO SERVER
+# ============================
+
+class AsyncHTTPServer:
+    """Single-threaded HTTP/1.1 server on an asyncio event loop.
+
+    Connections are kept alive between requests and pipelined requests are
+    answered in order, so one core can hold many idle clients without a thread each.
+    Mirrors the socketserver API (serve_forever / shutdown / server_close).
+    """
+
+    MAX_HEADER_SIZE = 16 * 1024  # Per-connection read buffer limit
+    BACKLOG = 4096
+
+    def __init__(self, server_address, route, fast_path=None, upload_route=None, reuse_port=False, blocking_route=False):
+        self.server_address = server_address
+        self.reuse_port = reuse_port  # Let several processes accept on the same port
+        self.route = route  # route(target) -> (status, headers, body, commit Future or None)
+        self.blocking_route = blocking_route  # route may wait on I/O; run it off the event loop
+        self.fast_path = fast_path  # fast_path(target) -> encoded response bytes or None
+        # upload_route(method, target) -> object with feed(chunk) / finish() returning
+        # response bytes, or None. Its output is streamed back with chunked encoding.
+        self.upload_route = upload_route
+        self.loop = None
+        self.stopped = None
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        host, port = self.server_address
+        server = await asyncio.start_server(self.handle_connection, host, port, reuse_address=True, reuse_port=self.reuse_port,
+                                            backlog=self.BACKLOG, limit=self.MAX_HEADER_SIZE)
+        async with server:
+            await self.stopped.wait()
+
+    def shutdown(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def server_close(self):
+        pass  # The listening socket is closed when serve() returns
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                request = self.parse_head(head)
+                if request is None:
+                    writer.write(encode_response(HTTPStatus.BAD_REQUEST, [], b"", keep_alive=False))
+                    break
+                method, target, version, headers = request
+
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+
+                upload = None
+                if method != "GET" and self.upload_route is not None:
+                    upload = self.upload_route(method, target)
+                if upload is not None:
+                    if "content-length" not in headers and headers.get("transfer-encoding", "").lower() != "chunked":
+                        # No way to tell where the body ends, as the threaded engine answers
+                        writer.write(encode_response(HTTPStatus.LENGTH_REQUIRED, [], b"", keep_alive=False))
+                        break
+                    await self.stream_upload(reader, writer, headers, upload)
+                    if not keep_alive:
+                        break
+                    await writer.drain()
+                    continue
+
+                # Skip over any body so the next pipelined request stays aligned
+                async for _ in self.read_body(reader, headers):
+                    pass
+
+                response = None
+                if method == "GET" and keep_alive and self.fast_path is not None:
+                    response = self.fast_path(target)
+                if response is None:
+                    if method == "GET":
+                        try:
+                            if self.blocking_route:
+                                routed = await self.loop.run_in_executor(None, self.route, target)
+                            else:
+                                routed = self.route(target)
+                            status, response_headers, body, commit = routed
+                            if commit is not None:
+                                await asyncio.wrap_future(commit)  # Other connections keep being served
+                        except Exception:
+                            logger.exception("Request for %s failed", target)
+                            status, response_headers, body = HTTPStatus.INTERNAL_SERVER_ERROR, [], b""
+                    elif method == "POST":
+                        status, response_headers, body = HTTPStatus.NOT_FOUND, [], b""  # Only uploads take a POST
+                    else:
+                        status, response_headers, body = HTTPStatus.NOT_IMPLEMENTED, [], b""
+                    response = encode_response(status, response_headers, body, keep_alive)
+                writer.write(response)
+
+                if not keep_alive:
+                    break
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream_upload(self, reader, writer, headers, upload):
+        """Feed a request body to an upload handler, streaming its output back."""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        loop = asyncio.get_running_loop()
+        async for chunk in self.read_body(reader, headers):
+            if self.blocking_route:
+                output = await loop.run_in_executor(None, upload.feed, chunk)
+            else:
+                output = upload.feed(chunk)
+            if output:
+                writer.write(encode_chunk(output))
+                await writer.drain()
+        output = await loop.run_in_executor(None, upload.finish)
+        writer.write(encode_chunk(output) + encode_chunk(b""))
+
+    @staticmethod
+    async def read_body(reader, headers):
+        """Yield a request body in pieces, for Content-Length or chunked bodies."""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    break
+                while size > 0:
+                    chunk = await reader.readexactly(min(size, READ_SIZE))
+                    size -= len(chunk)
+                    yield chunk
+                await reader.readline()  # CRLF after the chunk
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # Skip trailers
+            return
+
+        length = int(headers.get("content-length", 0) or 0)
+        while length > 0:
+            chunk = await reader.readexactly(min(length, READ_SIZE))
+            length -= len(chunk)
+            yield chunk
+
+    @staticmethod
+    def parse_head(head):
+        """Split a raw request head into (method, target, version, headers) or None."""
+        try:
+            request_line, *header_lines = head.decode('latin-1').split("\r\n")
+            method, target, version = request_line.split(" ")
+        except ValueError:
+            return None
+
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method, target, version, headers
@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# ============================
+# CONFIGURATION
+# ============================
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+WORKLOADS = ["redirect", "shorten", "mixed"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the URL shortener on loopback and report JSON results")
+    parser.add_argument("--entries", type=int, default=10000, help="Links in the synthetic url.json (1k to 10M)")
+    parser.add_argument("--workload", choices=WORKLOADS + ["all"], default="all")
+    parser.add_argument("--engine", default="threaded", help="Passed to server.py --engine")
+    parser.add_argument("--server-arg", action="append", default=[],
+                        help="Extra argument for server.py (repeatable), e.g. --server-arg=--cache-size=0")
+    parser.add_argument("--concurrency", type=int, default=32, help="Connections kept busy at once")
+    parser.add_argument("--processes", type=int, default=1, help="Client processes sharing the concurrency")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per workload")
+    parser.add_argument("--mix-redirects", type=float, default=0.9, help="Redirect share of the mixed workload")
+    parser.add_argument("--hot-keys", type=float, default=1.1,
+                        help="Zipf exponent for picking redirect keys (0 = uniform)")
+    parser.add_argument("--no-keep-alive", action="store_true", help="Open a new connection per request")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    return parser.parse_args()
+
+# ============================
+# SYNTHETIC DATA & SERVER
+# ============================
+
+def synthetic_key(i):
+    return f"b{i}"
+
+def write_synthetic_store(path, entries):
+    """Stream a url.json with `entries` links without building it in memory."""
+    with open(path, 'w') as f:
+        f.write("{\n")
+        for i in range(entries):
+            separator = ",\n" if i < entries - 1 else "\n"
+            f.write(f'    "{synthetic_key(i)}": "https://example.com/page/{i}"{separator}')
+        f.write("}\n")
+
+def start_server(workdir, args):
+    """Launch server.py in workdir and wait until it accepts connections."""
+    command = [sys.executable, SERVER_SCRIPT, "--engine", args.engine, "--port", str(args.port)] + args.server_arg
+    log = open(os.path.join(workdir, "server.out"), 'w')
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT)
+
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup, see {log.name}")
+        try:
+            socket.create_connection(("127.0.0.1", args.port), timeout=0.2).close()
+            return process, time.perf_counter() - started
+        except OSError:
+            time.sleep(0.05)
+
+def stop_server(process):
+    """Close stdin, which answers the server's 'Press ENTER to close' prompt."""
+    process.stdin.close()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# ============================
+# LOAD GENERATOR
+# ============================
+
+class KeyPicker:
+    """Picks redirect keys with a Zipf-like skew so a few keys get most hits."""
+
+    def __init__(self, entries, exponent):
+        self.entries = entries
+        self.exponent = exponent
+
+    def pick(self):
+        if self.exponent <= 0:
+            return synthetic_key(random.randrange(self.entries))
+        # Inverse-CDF sample of a bounded power law, cheap enough for the client hot loop
+        u = random.random()
+        if self.exponent == 1:
+            rank = int(self.entries ** u)
+        else:
+            a = 1 - self.exponent
+            rank = int(((self.entries ** a - 1) * u + 1) ** (1 / a))
+        return synthetic_key(min(rank, self.entries) - 1)
+
+async def read_response(reader):
+    """Read one response and return its status code."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    chunked = False
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding" and value.strip().lower() == b"chunked":
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+async def client(config, picker, deadline, latencies, statuses, worker_id):
+    reader = writer = None
+    counter = 0
+    while time.perf_counter() < deadline:
+        if config["workload"] == "redirect" or (config["workload"] == "mixed"
+                                                and random.random() < config["mix_redirects"]):
+            target = "/" + picker.pick()
+        else:
+            counter += 1
+            target = f"/bench-{os.getpid()}-{worker_id}-{counter}.example.org/path"
+
+        request = f"GET {target} HTTP/1.1\r\nHost: localhost\r\n"
+        if not config["keep_alive"]:
+            request += "Connection: close\r\n"
+        request = (request + "\r\n").encode()
+
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", config["port"])
+            writer.write(request)
+            status = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status = "error"
+            writer = None
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+
+        if not config["keep_alive"] and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+def run_clients(config, connections):
+    """Client process body: drive `connections` concurrent clients until the deadline."""
+    async def main():
+        picker = KeyPicker(config["entries"], config["hot_keys"])
+        latencies = []
+        statuses = {}
+        deadline = time.perf_counter() + config["duration"]
+        await asyncio.gather(*(client(config, picker, deadline, latencies, statuses, i)
+                               for i in range(connections)))
+        return latencies, statuses
+    return asyncio.run(main())
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def run_workload(workload, args):
+    config = {
+        "workload": workload,
+        "port": args.port,
+        "entries": args.entries,
+        "duration": args.duration,
+        "mix_redirects": args.mix_redirects,
+        "hot_keys": args.hot_keys,
+        "keep_alive": not args.no_keep_alive,
+    }
+    # Spread the concurrency over the client processes
+    shares = [args.concurrency // args.processes + (i < args.concurrency % args.processes)
+              for i in range(args.processes)]
+
+    started = time.perf_counter()
+    if args.processes == 1:
+        parts = [run_clients(config, shares[0])]
+    else:
+        with multiprocessing.Pool(args.processes) as pool:
+            parts = pool.starmap(run_clients, [(config, share) for share in shares])
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for part, _ in parts for latency in part)
+    statuses = {}
+    for _, part in parts:
+        for status, count in part.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+
+    ms = 1000
+    return {
+        "workload": workload,
+        "requests": len(latencies),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith(("2", "3"))),
+        "statuses": statuses,
+        "duration_s": elapsed,
+        "requests_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * ms if latencies else 0.0,
+            "p50": percentile(latencies, 0.50) * ms,
+            "p95": percentile(latencies, 0.95) * ms,
+            "p99": percentile(latencies, 0.99) * ms,
+            "max": latencies[-1] * ms if latencies else 0.0,
+        },
+    }
+
+# ============================
+# MAIN
+# ============================
+
+def main():
+    args = parse_args()
+    workloads = WORKLOADS if args.workload == "all" else [args.workload]
+    workdir = tempfile.mkdtemp(prefix="shortener-bench-")
+
+    report = {
+        "config": {
+            "entries": args.entries,
+            "engine": args.engine,
+            "server_args": args.server_arg,
+            "concurrency": args.concurrency,
+            "processes": args.processes,
+            "duration_s": args.duration,
+            "keep_alive": not args.no_keep_alive,
+            "mix_redirects": args.mix_redirects,
+            "hot_keys": args.hot_keys,
+            "python": sys.version.split()[0],
+        },
+        "results": [],
+    }
+    try:
+        started = time.perf_counter()
+        write_synthetic_store(os.path.join(workdir, "url.json"), args.entries)
+        report["setup"] = {"write_store_s": time.perf_counter() - started}
+
+        process, startup = start_server(workdir, args)
+        report["setup"]["server_startup_s"] = startup
+        try:
+            for workload in workloads:
+                report["results"].append(run_workload(workload, args))
+        finally:
+            stop_server(process)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import codecs
+import json
+
+# ============================
+# BULK INPUT PARSER
+# ============================
+
+class BulkParser:
+    """Incremental parser for a bulk upload body.
+
+    The body is either a JSON array or NDJSON (one item per line). Each item is a
+    URL string or an object {"url": ..., "name": ...}. Bytes are fed in as they
+    arrive and complete items come out, so a large upload is never held in memory.
+    """
+
+    MAX_ITEM_SIZE = 1024 * 1024  # An unparsable buffer this big is an error, not a partial item
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buffer = ""
+        self.mode = None  # "array" or "ndjson", decided by the first character
+        self.done = False  # Closing ']' of an array seen
+
+    def feed(self, data):
+        """Add raw body bytes. Returns the list of items completed by them."""
+        self.buffer += self.decoder.decode(data)
+        return self.parse(final=False)
+
+    def close(self):
+        """Signal end of body. Returns any remaining items."""
+        self.buffer += self.decoder.decode(b"", final=True)
+        items = self.parse(final=True)
+        if self.mode == "array" and not self.done:
+            raise ValueError("Unterminated JSON array")
+        return items
+
+    def parse(self, final):
+        if self.mode is None:
+            stripped = self.buffer.lstrip()
+            if not stripped:
+                return []
+            self.mode = "array" if stripped[0] == "[" else "ndjson"
+            self.buffer = stripped[1:] if self.mode == "array" else stripped
+
+        if self.mode == "ndjson":
+            return self.parse_lines(final)
+        return self.parse_array(final)
+
+    def parse_lines(self, final):
+        lines = self.buffer.split("\n")
+        self.buffer = "" if final else lines.pop()  # Keep the unfinished last line
+        if len(self.buffer) > self.MAX_ITEM_SIZE:
+            raise ValueError("Item too large")
+        items = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(MalformedItem(line, e))  # Lines are independent, keep going
+        return items
+
+    def parse_array(self, final):
+        items = []
+        pos = 0
+        buffer = self.buffer
+        while not self.done:
+            # Skip whitespace and separators between items
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                self.done = True
+                pos += 1
+                break
+            try:
+                item, pos = self.json.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final or len(buffer) - pos > self.MAX_ITEM_SIZE:
+                    raise ValueError("Malformed JSON array item")
+                break  # Item split across chunks, wait for more data
+            items.append(item)
+
+        self.buffer = buffer[pos:]
+        if self.done and self.buffer.strip():
+            raise ValueError("Data after end of JSON array")
+        return items
+
+class MalformedItem:
+    """An NDJSON line that isn't valid JSON, returned in its place so it can be reported."""
+
+    def __init__(self, line, error):
+        self.line = line
+        self.error = error
+
+def normalize_item(item):
+    """Return (url, custom_name) for a bulk item, or None if it has the wrong shape."""
+    if isinstance(item, str):
+        return item, None
+    if isinstance(item, dict) and isinstance(item.get("url"), str):
+        name = item.get("name")
+        return item["url"], name if isinstance(name, str) and name else None
+    return None
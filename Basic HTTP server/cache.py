@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+# ============================
+# REDIRECT CACHE
+# ============================
+
+class RedirectCache:
+    """Bounded LRU of request target -> fully encoded 302 response bytes.
+
+    Hot short keys are answered by writing the cached bytes straight to the socket,
+    skipping URL parsing and header building. Entries must be dropped with
+    invalidate() whenever the key they redirect for is replaced.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, target):
+        """Return the cached response for target, or None."""
+        with self.lock:
+            response = self.entries.get(target)
+            if response is None:
+                return None
+            self.entries.move_to_end(target)
+            self.hits += 1
+            return response
+
+    def fill(self, target, response, is_current):
+        """Cache a response built on a miss. is_current() re-checks the store afterwards,
+        so a replacement racing with this fill can't leave a stale entry behind."""
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self.misses += 1
+            self.entries[target] = response
+            self.entries.move_to_end(target)
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)  # Evict least recently used
+        if not is_current():
+            self.invalidate(target)
+
+    def invalidate(self, target):
+        with self.lock:
+            self.entries.pop(target, None)
+
+    def stats(self):
+        """Counters for sizing the cache."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,98 @@
+import fcntl
+import hashlib
+import json
+import os
+import secrets
+import string
+import threading
+
+# ============================
+# KEY ALLOCATOR
+# ============================
+
+ALPHABET = string.digits + string.ascii_letters  # base62
+
+def to_base62(number, length):
+    """Encode number as exactly `length` base62 characters."""
+    chars = []
+    for _ in range(length):
+        number, digit = divmod(number, 62)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+class KeyAllocator:
+    """Hands out unique short keys without looking anything up.
+
+    Keys come from a counter persisted in counter_file. Each process reserves a
+    block of ids under an exclusive file lock and then hands them out from memory,
+    so threads and processes never get the same id. With scramble on, ids go through
+    a keyed Feistel permutation of the keyspace, so keys are unique but not sequential.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, counter_file, length=7, block_size=1000, scramble=True):
+        self.counter_file = counter_file
+        self.length = length
+        self.block_size = block_size
+        self.scramble = scramble
+        self.keyspace = 62 ** length
+        self.lock = threading.Lock()
+        self.next_id = self.block_end = 0
+        self.secret = None
+
+        # Half-width (in bits) of the Feistel network covering the keyspace
+        bits = (self.keyspace - 1).bit_length()
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+
+        # A forked child must not hand out ids from the parent's block
+        os.register_at_fork(after_in_child=self.forget_block)
+
+    def forget_block(self):
+        self.lock = threading.Lock()
+        self.next_id = self.block_end = 0
+
+    def next_key(self):
+        with self.lock:
+            if self.next_id >= self.block_end:
+                self.reserve_block()
+            number = self.next_id
+            self.next_id += 1
+        if self.scramble:
+            number = self.permute(number)
+        return to_base62(number, self.length)
+
+    def reserve_block(self):
+        """Take the next block of ids from the counter file. Caller holds the lock."""
+        with open(self.counter_file, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+            f.seek(0)
+            content = f.read()
+            state = json.loads(content) if content.strip() else {"next": 0, "secret": secrets.token_hex(16)}
+
+            start = state["next"]
+            if start >= self.keyspace:
+                raise RuntimeError(f"Keyspace of {self.length}-character keys is exhausted")
+            state["next"] = min(start + self.block_size, self.keyspace)
+
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.secret = bytes.fromhex(state["secret"])
+        self.next_id, self.block_end = start, state["next"]
+
+    def permute(self, number):
+        """Keyed bijection on [0, keyspace): Feistel rounds with cycle-walking."""
+        while True:
+            left, right = number >> self.half_bits, number & self.half_mask
+            for round_number in range(self.ROUNDS):
+                digest = hashlib.blake2b(right.to_bytes(8, 'little'), digest_size=8, key=self.secret,
+                                         salt=round_number.to_bytes(16, 'little')).digest()
+                left, right = right, left ^ (int.from_bytes(digest, 'little') & self.half_mask)
+            number = (left << self.half_bits) | right
+            if number < self.keyspace:
+                return number
@@ -0,0 +1,178 @@
+import itertools
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import Future
+
+from shared_index import SharedIndex
+
+# ============================
+# WRITER (MASTER PROCESS)
+# ============================
+#
+# Each worker has one pipe to the master. Worker -> master messages are
+# (request id, op, params); master -> worker messages are (request id, status,
+# result), or (None, "invalidate", key) when another worker replaced a key.
+
+class StoreWriter:
+    """Single writer for pre-fork mode.
+
+    Owns the LinkStore (log + snapshot) and the SharedIndex file that workers map
+    for lookups. Workers send writes over a pipe each; a thread per pipe applies
+    them here, so the log only ever has one writer. Puts are answered when their
+    group commit is durable, and the key is visible to every worker by then.
+    """
+
+    def __init__(self, store, index_file):
+        self.store = store
+        self.index_file = index_file
+        self.index = SharedIndex.build(index_file, store.data.items())
+        self.lock = threading.Lock()
+        self.workers = []  # (process, pipe, send lock)
+
+    def spawn(self, count, target):
+        """Fork `count` workers running target(remote_store), then start serving them."""
+        context = multiprocessing.get_context("fork")
+        for _ in range(count):
+            conn, worker_conn = context.Pipe()
+            process = context.Process(target=run_worker, daemon=True,
+                                      args=(target, self.index_file, worker_conn))
+            process.start()
+            worker_conn.close()
+            self.workers.append((process, conn, threading.Lock()))
+
+        # Threads only start once every worker is forked
+        for _, conn, send_lock in self.workers:
+            threading.Thread(target=self.serve, args=(conn, send_lock), daemon=True).start()
+
+    def serve(self, conn, send_lock):
+        """Apply requests from one worker until its pipe closes."""
+        def reply(request_id, status, result):
+            with send_lock:
+                conn.send((request_id, status, result))
+
+        def reply_when_done(request_id, future):
+            error = future.exception()
+            if error is None:
+                reply(request_id, "ok", None)
+            else:
+                reply(request_id, "error", repr(error))
+
+        while True:
+            try:
+                request_id, op, params = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                result = getattr(self, "op_" + op)(*params)
+            except Exception as e:
+                reply(request_id, "error", repr(e))
+                continue
+            if isinstance(result, Future):
+                # Don't hold up this worker's next request while the group commits
+                result.add_done_callback(lambda future, request_id=request_id: reply_when_done(request_id, future))
+            else:
+                reply(request_id, "ok", result)
+
+    def op_find_key(self, url):
+        return self.store.find_key(url)
+
+    def op_put(self, key, url):
+        with self.lock:
+            replaced = key in self.store
+            commit = self.store.put(key, url, sync=False)
+            self.index.put(key, url)
+            if replaced:
+                # Other workers may have this key's redirect cached
+                for _, conn, send_lock in self.workers:
+                    with send_lock:
+                        conn.send((None, "invalidate", key))
+        return commit
+
+    def op_sync(self):
+        return self.store.sync(wait=False)
+
+    def stop(self):
+        for process, _, _ in self.workers:
+            process.terminate()
+        for process, _, _ in self.workers:
+            process.join()
+
+# ============================
+# WORKER SIDE
+# ============================
+
+class RemoteStore:
+    """The LinkStore interface as seen from a worker.
+
+    Lookups read the shared memory-mapped index directly; dedup lookups and
+    writes are forwarded to the single writer in the master process. Requests
+    are tagged with an id, so many can be in flight on the one pipe.
+    """
+
+    def __init__(self, index_file, conn):
+        self.index = SharedIndex(index_file)
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.ids = itertools.count()
+        self.waiting = {}  # request id -> Future
+        self.on_invalidate = None  # Called with a key another worker replaced
+        threading.Thread(target=self.read_replies, daemon=True).start()
+
+    def read_replies(self):
+        while True:
+            try:
+                request_id, status, result = self.conn.recv()
+            except (EOFError, OSError):
+                return
+            if request_id is None:
+                if self.on_invalidate is not None:
+                    self.on_invalidate(result)
+                continue
+            future = self.waiting.pop(request_id)
+            if status == "ok":
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"Store writer failed: {result}"))
+
+    def call(self, op, *params):
+        """Send a request to the writer. Returns a Future for its reply."""
+        future = Future()
+        request_id = next(self.ids)
+        self.waiting[request_id] = future
+        with self.send_lock:
+            self.conn.send((request_id, op, params))
+        return future
+
+    def __contains__(self, key):
+        return self.index.get(key) is not None
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key, default=None):
+        url = self.index.get(key)
+        return default if url is None else url
+
+    def find_key(self, url):
+        return self.call("find_key", url).result()
+
+    def put(self, key, url, sync=True):
+        commit = self.call("put", key, url)
+        if sync:
+            commit.result()
+        return commit
+
+    def sync(self, wait=True):
+        commit = self.call("sync")
+        if wait:
+            commit.result()
+        return commit
+
+    def close(self):
+        self.conn.close()
+
+def run_worker(target, index_file, conn):
+    """Worker process entry point."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The master handles Ctrl+C and stops us
+    target(RemoteStore(index_file, conn))
@@ -3,108 +3,404 @@ import http.server
 import socketserver
 from http import HTTPStatus
 import threading
-import os
-import random
-import string
 import urllib.parse
+import argparse
+import os
+import itertools
+import logging
+from time import perf_counter
+
+from store import LinkStore
+from aioserver import AsyncHTTPServer, encode_response, encode_chunk, READ_SIZE
+from bulk import BulkParser, MalformedItem, normalize_item
+from cache import RedirectCache
+from stats import RequestStats
+from prefork import StoreWriter
+from keys import KeyAllocator
+
+parser = argparse.ArgumentParser(description="URL shortener")
+parser.add_argument("--engine", choices=["threaded", "asyncio"], default="threaded",
+                    help="threaded: one thread per connection; asyncio: event loop with keep-alive")
+parser.add_argument("--port", type=int, default=8000)
+parser.add_argument("--cache-size", type=int, default=10000,
+                    help="Max pre-encoded redirects kept for hot keys (0 disables the cache)")
+parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                    help="DEBUG logs every request")
+parser.add_argument("--log-sample", type=int, default=0,
+                    help="At INFO, log one request in every N (0 disables per-request logging)")
+parser.add_argument("--workers", type=int, default=1,
+                    help="Pre-fork this many worker processes sharing the port via SO_REUSEPORT")
+parser.add_argument("--key-length", type=int, default=7, help="Length of generated base62 keys")
+parser.add_argument("--sequential-keys", action="store_true",
+                    help="Hand out keys in counter order instead of scrambling them")
+parser.add_argument("--commit-window-ms", type=float, default=5.0,
+                    help="How long a group commit waits for more writes before its fsync")
+parser.add_argument("--commit-batch", type=int, default=1000, help="Flush a group early once it holds this many writes")
+args = parser.parse_args()
 
 DATA_FILE = "url.json"
+KEYS_FILE = "url.keys"  # Persisted key counter, shared by all processes
+INDEX_FILE = "url.idx"  # Shared memory-mapped lookup table used by pre-fork workers
+ENGINE = args.engine
+PORT = args.port
+WORKERS = args.workers
+BASE_URL = f"http://localhost:{PORT}"
+LOG_SAMPLE = args.log_sample
+
+logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("shortener")
+request_counter = itertools.count()
 
-# Ensure the data file exists
-if not os.path.exists(DATA_FILE):
-    with open(DATA_FILE, 'w') as f:
-        json.dump({}, f)
+# Lock-free per-thread latency histograms, served on /_stats
+stats = RequestStats()
 
-# Load existing data
-with open(DATA_FILE, 'r') as f:
-    try:
-        data = json.load(f)
-    except json.JSONDecodeError:
-        data = {}  # Handle case where file is empty or corrupted
+# Snapshot + append-only log, replayed here before serving
+store = LinkStore(DATA_FILE, commit_window=args.commit_window_ms / 1000, commit_batch=args.commit_batch)
 
-def save_data():
-    """Save dictionary data to file."""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+# Unique keys from reserved counter blocks, no collision retries
+key_allocator = KeyAllocator(KEYS_FILE, length=args.key_length, scramble=not args.sequential_keys)
 
-def generate_random_string(length=6):
-    """Generate a short, random alphanumeric string."""
-    characters = string.ascii_letters + string.digits  # A-Z, a-z, 0-9
-    return ''.join(random.choices(characters, k=length))
+# Pre-encoded 302 responses for hot keys
+redirect_cache = RedirectCache(args.cache_size)
 
 def is_valid_url(url):
     """Check if the URL is valid."""
     parsed = urllib.parse.urlparse(url)
     return parsed.scheme in {"http", "https"} and parsed.netloc
 
+def normalize_url(url):
+    """The URL as it is stored, with https:// added if it lacks a scheme, or None if invalid."""
+    if not is_valid_url(url):
+        url = "https://" + url
+    return url if is_valid_url(url) else None
+
+""" ROUTES """
+def json_response(payload, status=HTTPStatus.OK):
+    """Build a JSON response as (status, headers, body)."""
+    return status, [("Content-Type", "application/json")], json.dumps(payload).encode()
+
+def redirect_response(url):
+    """Build a 302 redirect as (status, headers, body)."""
+    return HTTPStatus.FOUND, [("Location", url)], b""
+
+def cached_redirect(target):
+    """Fast path: the full 302 response bytes for a cached key, or None."""
+    started = perf_counter()
+    response = redirect_cache.get(target)
+    if response is not None:
+        stats.observe("redirect", perf_counter() - started)
+        log_request(target, HTTPStatus.FOUND)
+    return response
+
+def route(target):
+    """Resolve a request target to (status, headers, body, commit). Shared by both engines.
+
+    commit is None, or a Future the engine must wait for before sending the
+    response: the write behind it is only acknowledged once it is durable.
+    """
+    started = perf_counter()
+    name, (status, headers, body), commit = dispatch(target)
+
+    def done(commit=None):
+        failed = status >= 400 or (commit is not None and commit.exception() is not None)
+        stats.observe("error" if failed else name, perf_counter() - started)
+        log_request(target, status)
+
+    if commit is None:
+        done()
+    else:
+        commit.add_done_callback(done)
+    return status, headers, body, commit
+
+def dispatch(target):
+    """Pick the route for a target. Returns (route name, response, commit)."""
+    if target == '/_stats':
+        return "root", json_response(stats_report()), None
+
+    # Parse the request URL
+    started = perf_counter()
+    parsed_url = urllib.parse.urlparse(target)
+    path = parsed_url.path[1:]  # Remove leading '/'
+    query_params = urllib.parse.parse_qs(parsed_url.query)  # Extract query parameters
+    stats.stage("parse", perf_counter() - started)
+
+    if target == '/':
+        return "root", json_response({"message": "Hello, world!"}), None
+
+    # If the short name exists, redirect the user
+    started = perf_counter()
+    url = store.get(path)
+    stats.stage("lookup", perf_counter() - started)
+    if url is not None:
+        if target == '/' + path:
+            redirect_cache.fill(target, encode_response(*redirect_response(url)),
+                                lambda: store.get(path) == url)
+        return "redirect", redirect_response(url), None  # 302 Temporary Redirect
+
+    # Extract `name` parameter if provided
+    custom_name = query_params.get("name", [None])[0]  # Get first value or None
+    decoded_path = urllib.parse.unquote(path)  # Decode URL input
+
+    status, payload, commit = shorten(decoded_path, custom_name)
+    return "shorten", json_response(payload, status=status), commit
+
+def shorten(url, custom_name=None):
+    """Validate and store one URL. Returns (status, payload, commit Future or None)."""
+    # Ensure valid URLs
+    url = normalize_url(url)
+    if url is None:
+        return HTTPStatus.BAD_REQUEST, {"error": "Invalid URL"}, None
+
+    # Check if the URL is already stored with another key
+    started = perf_counter()
+    existing_key = store.find_key(url)
+    stats.stage("lookup", perf_counter() - started)
+
+    if custom_name:
+        # Store using custom name, replacing if it already exists
+        commit = persist(custom_name, url)
+        redirect_cache.invalidate('/' + custom_name)
+        return HTTPStatus.OK, {"short_url": f"{BASE_URL}/{custom_name}", "replaced": bool(existing_key)}, commit
+    if existing_key:
+        # Reuse the key the URL was already shortened to
+        return HTTPStatus.OK, {"short_url": f"{BASE_URL}/{existing_key}"}, None
+
+    # Allocate a fresh key if no custom name provided
+    seed = key_allocator.next_key()
+    while seed in store:
+        seed = key_allocator.next_key()  # Only a custom name can already hold a generated key
+    return HTTPStatus.OK, {"short_url": f"{BASE_URL}/{seed}"}, persist(seed, url)
+
+def persist(key, url):
+    """Queue key -> url for the store's next group commit. Returns the commit Future."""
+    started = perf_counter()
+    commit = store.put(key, url, sync=False)
+    commit.add_done_callback(lambda _: stats.stage("persist", perf_counter() - started))
+    return commit
+
+""" OBSERVABILITY """
+def stats_report():
+    """Everything exposed on /_stats."""
+    report = stats.snapshot()
+    report["redirect_cache"] = redirect_cache.stats()
+    report["links"] = len(store)
+    report["engine"] = ENGINE
+    report["workers"] = WORKERS
+    report["pid"] = os.getpid()  # With workers, each process reports its own counters
+    return report
+
+def log_request(target, status):
+    """Per-request logging: every request at DEBUG, or a 1-in-N sample at INFO."""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Visited path: %s (%d)", target, status)
+    elif LOG_SAMPLE and next(request_counter) % LOG_SAMPLE == 0:
+        logger.info("Visited path: %s (%d) [1 in %d sampled]", target, status, LOG_SAMPLE)
+
+""" BULK IMPORT """
+class BulkImport:
+    """One POST /_bulk request.
+
+    Body chunks go in through feed() and NDJSON result lines come out, one per
+    item, as soon as the item is stored. Records go out with the store's group
+    commits; finish() waits for every group the batch went into and appends a
+    summary line listing the URLs whose group failed, so clients should treat the
+    batch as committed only once they see it.
+    """
+
+    def __init__(self):
+        self.parser = BulkParser()
+        self.commits = {}  # commit Future -> URLs stored in its group
+        self.stored = 0
+        self.errors = 0
+        self.failed = False  # Body was malformed; the rest of it is ignored
+        self.started = perf_counter()
+
+    def feed(self, chunk):
+        """Process a body chunk. Returns the encoded result lines it produced."""
+        if self.failed:
+            return b""
+        try:
+            items = self.parser.feed(chunk)
+        except ValueError as e:
+            return self.fail(e)
+        return self.process(items)
+
+    def finish(self):
+        """Process the end of the body, commit the batch and return the last lines."""
+        lines = b""
+        if not self.failed:
+            try:
+                lines = self.process(self.parser.close())
+            except ValueError as e:
+                lines = self.fail(e)
+        started = perf_counter()
+        failed = []
+        for commit, urls in self.commits.items():
+            try:
+                commit.result()
+            except Exception as e:
+                logger.error("Bulk commit of %d items failed: %s", len(urls), e)
+                failed += urls
+        try:
+            # Deduplicated items may point at keys other requests are still writing
+            pending = store.sync(wait=False)
+            if pending not in self.commits:
+                pending.result()
+        except Exception as e:
+            logger.error("Bulk sync failed: %s", e)
+            self.errors += 1
+            lines += json.dumps({"error": f"Commit failed: {e}"}).encode() + b"\n"
+        stats.stage("persist", perf_counter() - started)
+        stats.observe("bulk", perf_counter() - self.started)
+        log_request("/_bulk", HTTPStatus.OK)
+        summary = {"committed": self.stored - len(failed), "errors": self.errors + len(failed), "failed": failed}
+        return lines + json.dumps(summary).encode() + b"\n"
+
+    def process(self, items):
+        lines = []
+        for item in items:
+            normalized = None if isinstance(item, MalformedItem) else normalize_item(item)
+            if isinstance(item, MalformedItem):
+                result = {"line": item.line[:200], "error": f"Malformed JSON: {item.error}"}
+            elif normalized is None:
+                result = {"item": item, "error": "Expected a URL string or {\"url\": ..., \"name\": ...}"}
+            else:
+                url, custom_name = normalized
+                url = normalize_url(url) or url
+                status, result, commit = shorten(url, custom_name)
+                result["url"] = url
+                if commit is not None:
+                    self.commits.setdefault(commit, []).append(url)
+            if "error" in result:
+                self.errors += 1
+            else:
+                self.stored += 1
+            lines.append(json.dumps(result).encode() + b"\n")
+        return b"".join(lines)
+
+    def fail(self, error):
+        self.failed = True
+        self.errors += 1
+        return json.dumps({"error": f"Malformed body: {error}"}).encode() + b"\n"
+
+def upload_route(method, target):
+    """Return a BulkImport for POST /_bulk, or None if nothing handles the request."""
+    if method == "POST" and urllib.parse.urlparse(target).path == "/_bulk":
+        return BulkImport()
+    return None
+
 """ HANDLER """
 class Handler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+    disable_nagle_algorithm = True  # Small keep-alive responses would wait on delayed ACKs
+    timeout = 30  # Seconds an idle keep-alive connection may hold its thread
+
     def do_GET(self):
-        print("Visited path:", self.path)
+        if not self.close_connection:
+            response = cached_redirect(self.path)
+            if response is not None:
+                self.wfile.write(response)
+                return
+
+        status, headers, body, commit = route(self.path)
+        if commit is not None:
+            try:
+                commit.result()  # Acknowledge only once the write is durable
+            except Exception:
+                logger.exception("Commit failed for %s", self.path)
+                status, headers, body = json_response({"error": "Write failed"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+        # Headers and body in one write, as the asyncio engine sends them
+        self.wfile.write(encode_response(status, headers, body, keep_alive=not self.close_connection))
 
-        # Parse the request URL
-        parsed_url = urllib.parse.urlparse(self.path)
-        path = parsed_url.path[1:]  # Remove leading '/'
-        query_params = urllib.parse.parse_qs(parsed_url.query)  # Extract query parameters
+    def log_message(self, format, *args):
+        """Send http.server's access/error lines through the leveled logger."""
+        logger.debug("%s - %s", self.address_string(), format % args)
 
-        if self.path == '/':
-            self.send_json_response({"message": "Hello, world!"})
+    def do_POST(self):
+        upload = upload_route("POST", self.path)
+        if upload is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
             return
 
-        # If the short name exists, redirect the user
-        if path in data:
-            self.send_response(HTTPStatus.FOUND)  # 302 Temporary Redirect
-            self.send_header("Location", data[path])
-            self.end_headers()
+        chunked = self.headers.get("Transfer-Encoding", "").lower() == "chunked"
+        length = self.headers.get("Content-Length")
+        if not chunked and length is None:
+            self.send_error(HTTPStatus.LENGTH_REQUIRED)
             return
 
-        # Extract `name` parameter if provided
-        custom_name = query_params.get("name", [None])[0]  # Get first value or None
-        decoded_path = urllib.parse.unquote(path)  # Decode URL input
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
 
-        # Ensure valid URLs
-        if not is_valid_url(decoded_path):
-            decoded_path = "https://" + decoded_path
+        body = self.read_chunked_body() if chunked else self.read_body(int(length))
+        for chunk in body:
+            self.wfile.write(encode_chunk(upload.feed(chunk)))
+        self.wfile.write(encode_chunk(upload.finish()))
+        self.wfile.write(encode_chunk(b""))  # Last chunk
 
-        if not is_valid_url(decoded_path):
-            self.send_json_response({"error": "Invalid URL"}, status=HTTPStatus.BAD_REQUEST)
-            return
+    def read_body(self, length):
+        """Yield a Content-Length body in pieces."""
+        while length > 0:
+            chunk = self.rfile.read(min(length, READ_SIZE))
+            if not chunk:
+                raise ConnectionError("Client closed the connection mid-body")
+            length -= len(chunk)
+            yield chunk
 
-        # Check if the URL is already stored with another key
-        existing_key = next((key for key, stored_url in data.items() if stored_url == decoded_path), None)
-
-        if custom_name:
-            # Store using custom name, replacing if it already exists
-            data[custom_name] = decoded_path
-            save_data()
-            self.send_json_response({"short_url": f"http://localhost:8000/{custom_name}", "replaced": bool(existing_key)})
-        else:
-            # Generate a random short key if no custom name provided
-            seed = generate_random_string()
-            data[seed] = decoded_path
-            save_data()
-            self.send_json_response({"short_url": f"http://localhost:8000/{seed}"})
-
-    def send_json_response(self, data, status=HTTPStatus.OK):
-        """Send a JSON response."""
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+    def read_chunked_body(self):
+        """Yield the chunks of a Transfer-Encoding: chunked body."""
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                break
+            yield from self.read_body(size)
+            self.rfile.readline()  # CRLF after the chunk
+        while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+            pass  # Skip trailers
 
 """ SOCKET ADDRESS """
 
-PORT = 8000
-
 # Use ThreadingTCPServer instead of TCPServer
 class ThreadingHTTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    pass
+    allow_reuse_address = True
+    allow_reuse_port = WORKERS > 1  # Pre-fork workers all bind the same port
+    request_queue_size = 1024  # Default of 5 drops SYNs under concurrent load
+    daemon_threads = True
+
+def make_server():
+    """Build the listening server for the chosen engine."""
+    if ENGINE == "asyncio":
+        # A pre-fork worker's dedup lookups are a round trip to the writer process
+        return AsyncHTTPServer(("0.0.0.0", PORT), route, fast_path=cached_redirect,
+                               upload_route=upload_route, reuse_port=WORKERS > 1, blocking_route=WORKERS > 1)
+    return ThreadingHTTPServer(("0.0.0.0", PORT), Handler)
 
-sk = ThreadingHTTPServer(("0.0.0.0", PORT), Handler)
-print(f"Server starting at http://localhost:{PORT}")
+def serve_worker(remote_store):
+    """Pre-fork worker: serve on the shared port with lookups from the shared index."""
+    global store
+    store = remote_store
+    store.on_invalidate = lambda key: redirect_cache.invalidate('/' + key)
+    make_server().serve_forever()
 
-t1 = threading.Thread(target=sk.serve_forever, daemon=True)
-t1.start()
+if WORKERS > 1:
+    writer = StoreWriter(store, INDEX_FILE)
+    writer.spawn(WORKERS, serve_worker)
+    print(f"Server starting at {BASE_URL} ({ENGINE} engine, {WORKERS} workers)")
+else:
+    sk = make_server()
+    print(f"Server starting at {BASE_URL} ({ENGINE} engine)")
+    t1 = threading.Thread(target=sk.serve_forever, daemon=True)
+    t1.start()
 
-input("Press ENTER to close...\n")
-sk.server_close()
\ No newline at end of file
+try:
+    input("Press ENTER to close...\n")
+except EOFError:
+    pass  # stdin closed (e.g. by the benchmark harness), shut down cleanly
+if WORKERS > 1:
+    writer.stop()
+else:
+    sk.shutdown()
+    sk.server_close()
+    print("Redirect cache:", redirect_cache.stats())
+store.close()
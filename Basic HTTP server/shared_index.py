@@ -0,0 +1,203 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+# ============================
+# FILE LAYOUT
+# ============================
+#
+# [header 64 B][slots: capacity x 16 B][records ...][free space]
+#
+# header : magic, capacity, count, data_end, seq, retired (u64 each, little endian)
+# slot   : key hash (u64), record offset (u64, 0 = empty)
+# record : key length (u16), url length (u32), key bytes, url bytes
+#
+# Records are append-only and written before the slot pointing at them, so a slot
+# never refers to a half-written record. Slot updates are wrapped in a seqlock:
+# the writer makes `seq` odd while it changes slots and even again afterwards, and
+# readers retry a lookup if `seq` was odd or moved while they probed.
+
+MAGIC = b"SURLIDX1"
+U64 = struct.Struct("<Q")
+SLOT = struct.Struct("<QQ")
+RECORD_HEAD = struct.Struct("<HI")
+
+CAPACITY_AT = 8
+COUNT_AT = 16
+DATA_END_AT = 24
+SEQ_AT = 32
+RETIRED_AT = 40
+HEADER_SIZE = 64
+
+MAX_LOAD = 0.7
+MIN_CAPACITY = 1024
+
+def key_hash(key_bytes):
+    """Stable 64-bit hash, identical in every process (unlike the salted built-in hash)."""
+    return int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), 'little')
+
+# ============================
+# SHARED INDEX
+# ============================
+
+class SharedIndex:
+    """Read-optimized key -> URL hash table in a memory-mapped file.
+
+    One process writes (put); any number of processes map the same file and look
+    keys up directly in shared memory, so a read never needs IPC. When the table
+    fills up the writer builds a bigger file, renames it into place and flags the
+    old one as retired; readers notice the flag and reopen.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # Serializes reopen/grow within this process
+        self.map_file()
+
+    @classmethod
+    def build(cls, path, items, capacity=None, reserve=0):
+        """Create a fresh index file holding items and return it opened for writing.
+        reserve is extra free record space to leave beyond the usual headroom."""
+        encoded = [(key.encode(), url.encode()) for key, url in items]
+        if capacity is None:
+            capacity = MIN_CAPACITY
+            while capacity * MAX_LOAD < len(encoded) * 2:
+                capacity *= 2
+        data_size = sum(RECORD_HEAD.size + len(k) + len(u) for k, u in encoded)
+        data_start = HEADER_SIZE + capacity * SLOT.size
+        size = data_start + max(data_size * 2, 1024 * 1024) + reserve
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.truncate(size)
+        with open(tmp_path, 'r+b') as f:
+            mm = mmap.mmap(f.fileno(), size)
+        mm[0:8] = MAGIC
+        U64.pack_into(mm, CAPACITY_AT, capacity)
+        U64.pack_into(mm, DATA_END_AT, data_start)
+
+        index = cls.__new__(cls)
+        index.path = path
+        index.lock = threading.Lock()
+        index.mm = mm
+        index.capacity = capacity
+        for key_bytes, url_bytes in encoded:
+            index.insert(key_bytes, url_bytes)
+        mm.flush()
+        os.replace(tmp_path, path)
+        return index
+
+    def map_file(self):
+        with open(self.path, 'r+b') as f:
+            self.mm = mmap.mmap(f.fileno(), 0)
+        if self.mm[0:8] != MAGIC:
+            raise ValueError(f"{self.path} is not a shared index file")
+        self.capacity = U64.unpack_from(self.mm, CAPACITY_AT)[0]
+
+    def reopen(self):
+        with self.lock:
+            if U64.unpack_from(self.mm, RETIRED_AT)[0]:
+                self.map_file()
+
+    def __len__(self):
+        return U64.unpack_from(self.mm, COUNT_AT)[0]
+
+    # ---------- Reads (any process) ----------
+
+    def get(self, key):
+        """Return the URL stored for key, or None."""
+        key_bytes = key.encode()
+        h = key_hash(key_bytes)
+        while True:
+            mm = self.mm
+            if U64.unpack_from(mm, RETIRED_AT)[0]:
+                self.reopen()
+                continue
+            seq = U64.unpack_from(mm, SEQ_AT)[0]
+            if seq & 1:
+                continue  # Writer is mid-update
+            try:
+                offset = self.find_slot(mm, self.capacity, key_bytes, h)[1]
+                url = self.read_record(mm, offset)[1] if offset else None
+            except (struct.error, ValueError, UnicodeDecodeError):
+                url = None  # Torn read, the seq check below retries it
+            if U64.unpack_from(mm, SEQ_AT)[0] == seq:
+                return url.decode() if url is not None else None
+
+    @staticmethod
+    def find_slot(mm, capacity, key_bytes, h):
+        """Linear-probe for key. Returns (slot position, record offset or 0 if absent)."""
+        mask = capacity - 1
+        i = h & mask
+        while True:
+            position = HEADER_SIZE + i * SLOT.size
+            slot_hash, offset = SLOT.unpack_from(mm, position)
+            if offset == 0:
+                return position, 0
+            if slot_hash == h:
+                klen = RECORD_HEAD.unpack_from(mm, offset)[0]
+                start = offset + RECORD_HEAD.size
+                if mm[start:start + klen] == key_bytes:
+                    return position, offset
+            i = (i + 1) & mask
+
+    @staticmethod
+    def read_record(mm, offset):
+        klen, ulen = RECORD_HEAD.unpack_from(mm, offset)
+        start = offset + RECORD_HEAD.size
+        return mm[start:start + klen], mm[start + klen:start + klen + ulen]
+
+    def items(self):
+        """Yield every (key bytes, url bytes). Only safe in the writer process."""
+        for i in range(self.capacity):
+            offset = SLOT.unpack_from(self.mm, HEADER_SIZE + i * SLOT.size)[1]
+            if offset:
+                yield self.read_record(self.mm, offset)
+
+    # ---------- Writes (single writer process) ----------
+
+    def put(self, key, url):
+        """Insert or replace key -> url, growing the file if needed."""
+        with self.lock:
+            key_bytes, url_bytes = key.encode(), url.encode()
+            record_size = RECORD_HEAD.size + len(key_bytes) + len(url_bytes)
+            count = U64.unpack_from(self.mm, COUNT_AT)[0]
+            data_end = U64.unpack_from(self.mm, DATA_END_AT)[0]
+            if count + 1 > self.capacity * MAX_LOAD or data_end + record_size > len(self.mm):
+                self.grow(record_size)
+            self.insert(key_bytes, url_bytes)
+
+    def insert(self, key_bytes, url_bytes):
+        mm = self.mm
+        h = key_hash(key_bytes)
+        data_end = U64.unpack_from(mm, DATA_END_AT)[0]
+
+        # Write the record past data_end first; nothing points at it yet
+        RECORD_HEAD.pack_into(mm, data_end, len(key_bytes), len(url_bytes))
+        start = data_end + RECORD_HEAD.size
+        mm[start:start + len(key_bytes)] = key_bytes
+        mm[start + len(key_bytes):start + len(key_bytes) + len(url_bytes)] = url_bytes
+        new_end = start + len(key_bytes) + len(url_bytes)
+
+        position, existing = self.find_slot(mm, self.capacity, key_bytes, h)
+        seq = U64.unpack_from(mm, SEQ_AT)[0]
+        U64.pack_into(mm, SEQ_AT, seq + 1)
+        SLOT.pack_into(mm, position, h, data_end)
+        if not existing:
+            U64.pack_into(mm, COUNT_AT, U64.unpack_from(mm, COUNT_AT)[0] + 1)
+        U64.pack_into(mm, DATA_END_AT, new_end)
+        U64.pack_into(mm, SEQ_AT, seq + 2)
+
+    def grow(self, extra):
+        """Rebuild into a file with twice the room and retire this one. Caller holds the lock."""
+        old = self.mm
+        items = [(k.decode(), u.decode()) for k, u in self.items()]
+        capacity = self.capacity
+        if len(items) + 1 > capacity * MAX_LOAD:
+            capacity *= 2
+        bigger = SharedIndex.build(self.path, items, capacity, reserve=extra)
+        self.mm, self.capacity = bigger.mm, bigger.capacity
+        U64.pack_into(old, RETIRED_AT, 1)  # Readers still on the old file reopen
+        old.close()
@@ -0,0 +1,127 @@
+import threading
+import time
+from bisect import bisect_left
+
+# ============================
+# REQUEST STATS
+# ============================
+
+# Upper bounds of the latency buckets, in milliseconds (the last bucket is unbounded)
+BUCKETS_MS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+BOUNDS_S = [bound / 1000 for bound in BUCKETS_MS]
+
+ROUTES = ["redirect", "shorten", "root", "bulk", "error"]
+STAGES = ["parse", "lookup", "persist"]
+
+class Histogram:
+    """Fixed-bucket latency histogram with a count and a running sum."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS_S) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, seconds):
+        self.counts[bisect_left(BOUNDS_S, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.total += other.total
+        self.count += other.count
+
+    def percentile(self, fraction):
+        """Upper bound (ms) of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS + [float("inf")], self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def export(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": [[f"le_{bound}ms", n] for bound, n in zip(BUCKETS_MS + ["inf"], self.counts)],
+        }
+
+class Shard:
+    """The histograms written by one thread."""
+
+    def __init__(self):
+        self.routes = {name: Histogram() for name in ROUTES}
+        self.stages = {name: Histogram() for name in STAGES}
+
+    def merge(self, other):
+        for name, histogram in other.routes.items():
+            self.routes[name].merge(histogram)
+        for name, histogram in other.stages.items():
+            self.stages[name].merge(histogram)
+
+class RequestStats:
+    """Per-route and per-stage latency histograms.
+
+    Each thread records into its own shard, so the request path never takes a
+    lock; shards are only summed when a snapshot is read. Shards of finished
+    threads are folded into one so thread-per-connection serving doesn't grow
+    the registry without bound.
+    """
+
+    PRUNE_AT = 256  # Fold dead threads' shards once the registry gets this big
+
+    def __init__(self):
+        self.started = time.time()
+        self.local = threading.local()
+        self.lock = threading.Lock()  # Guards the shard registry only
+        self.shards = []  # (thread, shard)
+        self.retired = Shard()
+
+    def shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = Shard()
+            with self.lock:
+                self.shards.append((threading.current_thread(), shard))
+                if len(self.shards) >= self.PRUNE_AT:
+                    self.prune()
+        return shard
+
+    def prune(self):
+        """Fold shards of finished threads into the retired shard. Caller holds the lock."""
+        alive = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self.retired.merge(shard)
+        self.shards = alive
+
+    def observe(self, route, seconds):
+        self.shard().routes[route].add(seconds)
+
+    def stage(self, stage, seconds):
+        self.shard().stages[stage].add(seconds)
+
+    def snapshot(self):
+        total = Shard()
+        with self.lock:
+            self.prune()
+            total.merge(self.retired)
+            for _, shard in self.shards:
+                total.merge(shard)
+        return {
+            "uptime_s": time.time() - self.started,
+            "routes": {name: histogram.export() for name, histogram in total.routes.items()},
+            "stages": {name: histogram.export() for name, histogram in total.stages.items()},
+        }
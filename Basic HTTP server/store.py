@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+# ============================
+# LINK STORE
+# ============================
+
+class LinkStore:
+    """Short key -> URL mapping persisted as a JSON snapshot plus an append-only log.
+
+    Every new mapping is appended to the log as one JSON line, so a write costs the
+    same no matter how many links exist. Writes arriving close together are
+    group-committed: one write and one fsync per group. On startup the snapshot is
+    loaded and the log replayed on top of it; a background thread periodically
+    folds the log back into the snapshot.
+    """
+
+    def __init__(self, snapshot_file, compact_every=10000, fsync=True, commit_window=0.005, commit_batch=1000):
+        self.snapshot_file = snapshot_file
+        self.log_file = os.path.splitext(snapshot_file)[0] + ".log"
+        self.rotated_file = self.log_file + ".old"  # Log being folded into the snapshot
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self.data = {}
+        self.url_index = {}  # url -> key, so dedup lookups don't scan the whole store
+        self.url_others = {}  # url -> {key: None} of its other keys, for URLs stored more than once
+        self.lock = threading.Lock()
+        self.log_records = 0
+        self.compactor = None
+
+        # Group commit: records queue up in memory and a flusher thread writes each
+        # group with one write + fsync, then completes the group's Future
+        self.commit_window = commit_window  # Seconds a group stays open for more records
+        self.commit_batch = commit_batch  # ...or until it holds this many
+        self.pending = []
+        self.group = None  # Future of the pending group
+        self.group_started = 0.0
+        self.flushing = Future()  # Future of the last group handed to the flusher
+        self.flushing.set_result(0)
+        self.flush_wanted = threading.Condition(self.lock)
+        self.io_lock = threading.Lock()  # Held while the log file is written or swapped
+        self.closing = False
+
+        self.load()
+        self.flusher = threading.Thread(target=self.run_flusher, daemon=True)
+        self.flusher.start()
+
+    # ---------- Loading ----------
+
+    def load(self):
+        """Load the snapshot and replay any logs written since it was taken."""
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                try:
+                    self.data = json.load(f)
+                except json.JSONDecodeError:
+                    self.data = {}  # Handle case where file is empty or corrupted
+
+        interrupted = os.path.exists(self.rotated_file)
+        if interrupted:
+            self.replay(self.rotated_file)
+        self.log_records = self.replay(self.log_file)
+
+        # The first key stored for a URL wins
+        for key, url in self.data.items():
+            self.index_url(key, url)
+
+        if interrupted:
+            # A previous compaction didn't finish. Both logs are merged in memory now, so
+            # fold them into the snapshot before touching either: the rotated log is the
+            # only copy of its records until the snapshot is written
+            self.write_snapshot(dict(self.data))
+            open(self.log_file, 'wb').close()
+            self.log_records = 0
+        self.log = open(self.log_file, 'ab')
+
+    def replay(self, path):
+        """Apply every complete record in a log file. Returns the number applied."""
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        good_offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Torn write from a crash, drop it
+                try:
+                    key, url = json.loads(line)
+                except ValueError:
+                    break
+                self.data[key] = url
+                good_offset += len(line)
+                count += 1
+
+        # Cut off a torn tail so new records aren't appended onto garbage
+        if good_offset != os.path.getsize(path):
+            with open(path, 'r+b') as f:
+                f.truncate(good_offset)
+        return count
+
+    # ---------- Lookups ----------
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def find_key(self, url):
+        """Return a key already pointing to url, or None."""
+        return self.url_index.get(url)
+
+    # ---------- Writes ----------
+
+    def put(self, key, url, sync=True):
+        """Store key -> url and queue it for the next group commit.
+
+        Returns a Future that completes once the record's group is on disk. With
+        sync=True this waits for it, so the caller can acknowledge the write.
+        """
+        record = json.dumps([key, url]).encode() + b"\n"
+        with self.lock:
+            old_url = self.data.get(key)
+            self.data[key] = url
+            if old_url != url:
+                if old_url is not None:
+                    self.unindex_url(key, old_url)
+                self.index_url(key, url)
+
+            group = self.queue(record)
+
+            self.log_records += 1
+            if self.log_records >= self.compact_every and self.compactor is None:
+                self.compactor = threading.Thread(target=self.compact, daemon=True)
+                self.compactor.start()
+
+        if sync:
+            group.result()
+        return group
+
+    def index_url(self, key, url):
+        """Record that key stores url. Caller holds the lock."""
+        if url not in self.url_index:
+            self.url_index[url] = key
+        else:
+            self.url_others.setdefault(url, {})[key] = None
+
+    def unindex_url(self, key, url):
+        """Forget that key stored url, handing its dedup entry to the next key
+        storing it, if any. Caller holds the lock."""
+        others = self.url_others.get(url)
+        if self.url_index.get(url) == key:
+            if others:
+                self.url_index[url] = next(iter(others))
+                del others[self.url_index[url]]
+            else:
+                del self.url_index[url]
+        elif others:
+            others.pop(key, None)
+        if others is not None and not others:
+            del self.url_others[url]
+
+    def queue(self, record):
+        """Add a record to the pending group and return its Future. Caller holds the lock."""
+        if not self.pending:
+            self.group = Future()
+            self.group_started = time.monotonic()
+            self.flush_wanted.notify()
+        self.pending.append(record)
+        if len(self.pending) >= self.commit_batch:
+            self.flush_wanted.notify()
+        return self.group
+
+    def sync(self, wait=True):
+        """Return a Future for everything queued so far; with wait=True, wait for it."""
+        with self.lock:
+            group = self.group if self.pending else self.flushing
+        if wait:
+            group.result()
+        return group
+
+    def run_flusher(self):
+        """Background thread: write each group of records with one write and one fsync."""
+        while True:
+            with self.lock:
+                while not self.pending and not self.closing:
+                    self.flush_wanted.wait()
+                if not self.pending:
+                    return  # Closing and nothing left to write
+
+                # Let the group fill up for the commit window, or until it's big enough
+                deadline = self.group_started + self.commit_window
+                while len(self.pending) < self.commit_batch and not self.closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.flush_wanted.wait(remaining)
+
+                records, group = self.pending, self.group
+                self.pending = []
+                self.flushing = group
+
+            try:
+                with self.io_lock:
+                    self.log.write(b"".join(records))
+                    self.log.flush()
+                    if self.fsync:
+                        os.fsync(self.log.fileno())
+            except Exception as e:
+                group.set_exception(e)
+            else:
+                group.set_result(len(records))
+
+    # ---------- Compaction ----------
+
+    def rotate_log(self):
+        """Move the current log aside and start a fresh one. Caller holds the lock."""
+        with self.io_lock:  # Not while the flusher is writing a group
+            self.log.close()
+            os.replace(self.log_file, self.rotated_file)
+            self.log = open(self.log_file, 'ab')
+        self.log_records = 0
+
+    def write_snapshot(self, snapshot):
+        """Atomically replace the snapshot file, then drop the folded log."""
+        tmp_file = self.snapshot_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(snapshot, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+        os.remove(self.rotated_file)
+
+    def compact(self):
+        """Fold the log into a new snapshot without blocking writers for the dump."""
+        try:
+            with self.lock:
+                if os.path.exists(self.rotated_file):
+                    # An earlier compaction failed to fold this log. Rotating would
+                    # overwrite it, so fold it and the current log in this snapshot
+                    self.log_records = 0
+                else:
+                    self.rotate_log()
+                snapshot = dict(self.data)
+            self.write_snapshot(snapshot)
+        finally:
+            self.compactor = None
+
+    def close(self):
+        """Write out pending records, wait for a running compaction and close the log."""
+        with self.lock:
+            self.closing = True
+            self.flush_wanted.notify()
+        self.flusher.join()
+        compactor = self.compactor
+        if compactor is not None:
+            compactor.join()
+        with self.lock:
+            self.log.close()
@@ -0,0 +1,305 @@
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from pdict import PersistentDict
+
+# ============================
+# CONFIGURATION
+# ============================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the persistent dictionary storage engines and report JSON results")
+    parser.add_argument("--sizes", default="1e3,1e4,1e5",
+                        help="Comma-separated key counts to preload, e.g. 1e3,1e4,1e5,1e6,1e7")
+    parser.add_argument("--engine", choices=list(ENGINES) + ["all"], default="all")
+    parser.add_argument("--ops", type=int, default=1000, help="Operations timed per phase")
+    parser.add_argument("--phase-budget", type=float, default=10.0,
+                        help="Stop a phase early after this many seconds (the JSON engine is O(n) per write)")
+    parser.add_argument("--value-size", type=int, default=16, help="Characters per value")
+    parser.add_argument("--fsync", action="store_true", help="fsync after every write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Report progress on stderr as each case finishes")
+    return parser.parse_args()
+
+# ============================
+# ENGINES
+# ============================
+#
+# Each engine wraps one way of storing the dictionary behind the same calls, so
+# the phases below time them identically.
+
+class JsonEngine:
+    """The original persistent-dict.py: the whole dict in memory, and the whole
+    file rewritten with json.dump after every change."""
+
+    def __init__(self, workdir, fsync):
+        self.path = os.path.join(workdir, "data.json")
+        self.fsync = fsync
+        self.data = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.data = json.load(f)
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.data, f, indent=4)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def preload(self, items):
+        self.data.update(items)
+        self.save()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.save()
+
+    def close(self):
+        pass
+
+class PdictEngine:
+    """pdict.PersistentDict: append-only log with a memory-mapped hash index."""
+
+    serializer = "json"
+
+    def __init__(self, workdir, fsync):
+        self.store = PersistentDict(os.path.join(workdir, "data.db"), fsync=fsync, serializer=self.serializer)
+
+    PRELOAD_BATCH = 10000  # Keys per transaction, so the preload's buffers don't set the peak RSS
+
+    def preload(self, items):
+        items = iter(items)
+        while True:
+            batch = dict(itertools.islice(items, self.PRELOAD_BATCH))
+            if not batch:
+                return
+            self.store.update(batch)
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store[key] = value
+
+    def compact(self):
+        self.store.compact()
+
+    def close(self):
+        self.store.close()
+
+class PdictBinaryEngine(PdictEngine):
+    """PersistentDict with the binary log format."""
+
+    serializer = "binary"
+
+ENGINES = {"json": JsonEngine, "pdict": PdictEngine, "pdict-binary": PdictBinaryEngine}
+
+# ============================
+# MEASUREMENTS
+# ============================
+
+def key_for(i):
+    return f"key{i:010d}"
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def time_phase(operation, arguments, budget):
+    """Run operation(*argument) for each argument until the budget runs out."""
+    latencies = []
+    deadline = time.perf_counter() + budget
+    started = time.perf_counter()
+    for argument in arguments:
+        before = time.perf_counter()
+        operation(*argument)
+        latencies.append(time.perf_counter() - before)
+        if before > deadline:
+            break
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = 1000
+    return {
+        "ops": len(latencies),
+        "duration_s": elapsed,
+        "ops_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * ms if latencies else 0.0,
+            "p50": percentile(latencies, 0.50) * ms,
+            "p99": percentile(latencies, 0.99) * ms,
+            "max": latencies[-1] * ms if latencies else 0.0,
+        },
+    }
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+
+def run_case(engine_name, size, workdir, args):
+    """Preload `size` keys and time each phase. Runs in a fresh process, so peak
+    RSS belongs to this engine and size alone."""
+    rng = random.Random(args.seed)
+    value = "v" * args.value_size
+    engine = ENGINES[engine_name](workdir, args.fsync)
+
+    started = time.perf_counter()
+    engine.preload((key_for(i), value) for i in range(size))
+    result = {"preload_s": time.perf_counter() - started, "phases": {}}
+
+    phases = result["phases"]
+    phases["sequential_insert"] = time_phase(
+        engine.set, ((key_for(size + i), value) for i in range(args.ops)), args.phase_budget)
+    phases["random_insert"] = time_phase(
+        engine.set, ((f"rnd{rng.getrandbits(64):016x}", value) for _ in range(args.ops)), args.phase_budget)
+    phases["lookup"] = time_phase(
+        engine.get, ((key_for(rng.randrange(size)),) for _ in range(args.ops)), args.phase_budget)
+    phases["update"] = time_phase(
+        engine.set, ((key_for(rng.randrange(size)), value.upper()) for _ in range(args.ops)), args.phase_budget)
+    engine.close()
+
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+def cold_open(engine_name, workdir, args):
+    """Open an existing store in a fresh process and read one key."""
+    started = time.perf_counter()
+    engine = ENGINES[engine_name](workdir, args.fsync)
+    engine.get(key_for(0))
+    elapsed = time.perf_counter() - started
+    engine.close()
+    return {"cold_open_s": elapsed, "peak_rss_kb": peak_rss_kb()}
+
+READERS = 3
+COMPACTIONS = 5
+
+def lookups_during_compaction(engine_name, size, workdir, args):
+    """Reader threads look up keys that always exist while this thread keeps
+    overwriting other keys and compacting the store. Every lookup must find
+    its key: a miss or an error means a reader saw the log and index mid-swap."""
+    engine = ENGINES[engine_name](workdir, args.fsync)
+    keys = [key_for(i) for i in range(min(size, 1000))]
+    stop = threading.Event()
+    counts, errors = [], []
+
+    def read(i):
+        lookups = 0
+        while not stop.is_set():
+            key = keys[i % len(keys)]
+            try:
+                if engine.get(key) is None:
+                    errors.append(f"{key} missing")
+            except Exception as e:
+                errors.append(f"{key}: {e!r}")
+            lookups += 1
+            i += 7
+        counts.append(lookups)
+
+    readers = [threading.Thread(target=read, args=(i,)) for i in range(READERS)]
+    started = time.perf_counter()
+    for reader in readers:
+        reader.start()
+    compactions = 0
+    deadline = started + args.phase_budget
+    while compactions < COMPACTIONS and (compactions == 0 or time.perf_counter() < deadline):
+        for i in range(args.ops):
+            engine.set(f"churn{i % 50}", i)
+        engine.compact()
+        compactions += 1
+    stop.set()
+    for reader in readers:
+        reader.join()
+    elapsed = time.perf_counter() - started
+    engine.close()
+    return {
+        "readers": READERS,
+        "compactions": compactions,
+        "lookups": sum(counts),
+        "lookups_per_s": sum(counts) / elapsed,
+        "errors": len(errors),
+        "first_errors": errors[:5],
+    }
+
+def in_fresh_process(function, *params):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, params)
+
+def files_size(workdir):
+    return sum(os.path.getsize(path) for path in glob.glob(os.path.join(workdir, "*")) if os.path.isfile(path))
+
+# ============================
+# MAIN
+# ============================
+
+def main():
+    args = parse_args()
+    engines = list(ENGINES) if args.engine == "all" else [args.engine]
+    sizes = [int(float(size)) for size in args.sizes.split(",")]
+
+    report = {
+        "config": {
+            "sizes": sizes,
+            "engines": engines,
+            "ops": args.ops,
+            "phase_budget_s": args.phase_budget,
+            "value_size": args.value_size,
+            "fsync": args.fsync,
+            "seed": args.seed,
+            "python": sys.version.split()[0],
+        },
+        "results": [],
+    }
+    for size in sizes:
+        for engine_name in engines:
+            workdir = tempfile.mkdtemp(prefix="pdict-bench-")
+            try:
+                result = {"engine": engine_name, "keys": size}
+                result.update(in_fresh_process(run_case, engine_name, size, workdir, args))
+                result["file_size_bytes"] = files_size(workdir)
+                reopened = in_fresh_process(cold_open, engine_name, workdir, args)
+                result["cold_open_s"] = reopened["cold_open_s"]
+                result["cold_open_peak_rss_kb"] = reopened["peak_rss_kb"]
+                if hasattr(ENGINES[engine_name], "compact"):
+                    result["phases"]["lookup_during_compaction"] = in_fresh_process(
+                        lookups_during_compaction, engine_name, size, workdir, args)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            report["results"].append(result)
+            if args.verbose:
+                print(f"{engine_name} at {size} keys done", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    # Lookups racing a compaction must never miss; fail loudly so this doubles as a regression check
+    failed = [result for result in report["results"]
+              if result["phases"].get("lookup_during_compaction", {}).get("errors")]
+    for result in failed:
+        print(f"{result['engine']} at {result['keys']} keys: lookups failed during compaction: "
+              f"{result['phases']['lookup_during_compaction']['first_errors']}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
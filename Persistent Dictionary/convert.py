@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+
+from pdict import PersistentDict
+from serializers import SERIALIZERS
+
+# ============================
+# CONVERTER
+# ============================
+#
+#   convert.py from-json data.json data.db --format binary   build a store from a JSON file
+#   convert.py to-json data.db data.json                     dump a store as a JSON file
+#   convert.py reformat data.db --format json                rewrite a store's log in another format
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert the persistent dictionary between JSON and its log formats")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    from_json = commands.add_parser("from-json", help="Load a JSON object into a new or existing store")
+    from_json.add_argument("json_file")
+    from_json.add_argument("store")
+    from_json.add_argument("--format", choices=list(SERIALIZERS), default="binary",
+                           help="Log format if the store is created")
+
+    to_json = commands.add_parser("to-json", help="Write a store out as a JSON object")
+    to_json.add_argument("store")
+    to_json.add_argument("json_file")
+
+    reformat = commands.add_parser("reformat", help="Rewrite a store's log in another format")
+    reformat.add_argument("store")
+    reformat.add_argument("--format", choices=list(SERIALIZERS), required=True)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command != "from-json" and not os.path.exists(args.store):
+        raise SystemExit(f"{args.store} does not exist")
+
+    if args.command == "from-json":
+        with open(args.json_file, 'r') as f:
+            entries = json.load(f)
+        with PersistentDict(args.store, serializer=args.format) as store:
+            store.update(entries)  # One transaction
+            print(f"Loaded {len(entries)} keys into {args.store} ({store.serializer.name})")
+    elif args.command == "to-json":
+        with PersistentDict(args.store) as store:
+            store.export_json(args.json_file)
+            print(f"Wrote {len(store)} keys to {args.json_file}")
+    else:
+        with PersistentDict(args.store) as store:
+            before = os.path.getsize(args.store)
+            store.compact(serializer=args.format)
+            print(f"Rewrote {args.store} as {args.format}: {before} -> {os.path.getsize(args.store)} bytes")
+
+if __name__ == "__main__":
+    main()
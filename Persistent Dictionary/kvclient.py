@@ -0,0 +1,159 @@
+import socket
+
+from kvprotocol import DEFAULT_PORT, SCAN_LIMIT, encode_message, split_frames
+
+# ============================
+# KEY-VALUE CLIENT
+# ============================
+#
+#   with KVClient("127.0.0.1") as kv:
+#       kv.set("apple", 3)
+#       kv.get("apple")                       # 3
+#       kv.mset({"a": 1, "b": 2})             # one transaction on the server
+#       for key, value in kv.scan(prefix="a"):
+#           ...
+#       with kv.pipeline() as p:              # one round trip for all of these
+#           for i in range(1000):
+#               p.set(f"key{i}", i)
+
+class KVError(RuntimeError):
+    """The server answered a request with an error."""
+
+class KVClient:
+    """Blocking client for kvserver.py."""
+
+    READ_SIZE = 256 * 1024
+    SCAN_PAGE = 1000
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = bytearray()
+        self.responses = []
+
+    def call(self, *requests):
+        """Send every request in one write, then read their responses in order."""
+        self.sock.sendall(b"".join(encode_message(request) for request in requests))
+        while len(self.responses) < len(requests):
+            data = self.sock.recv(self.READ_SIZE)
+            if not data:
+                raise ConnectionError("Server closed the connection")
+            self.buffer += data
+            messages, consumed = split_frames(self.buffer)
+            del self.buffer[:consumed]
+            self.responses += messages
+        responses = self.responses[:len(requests)]
+        del self.responses[:len(requests)]
+        return responses
+
+    def request(self, *request):
+        return result(self.call(list(request))[0])
+
+    # ---------- Commands ----------
+
+    def get(self, key, default=None):
+        response = self.call(["GET", key])[0]
+        if response[0] == "NOT_FOUND":
+            return default
+        return result(response)
+
+    def set(self, key, value):
+        self.request("SET", key, value)
+
+    def delete(self, key):
+        """Delete key. True if it existed."""
+        return self.request("DEL", key)
+
+    def mget(self, keys):
+        """{key: value} for the keys that exist."""
+        return self.request("MGET", list(keys))
+
+    def mset(self, items):
+        """Write every item in one transaction."""
+        return self.request("MSET", dict(items))
+
+    def mdel(self, keys):
+        """Delete keys in one transaction. Returns how many existed."""
+        return self.request("MDEL", list(keys))
+
+    def scan(self, start=None, stop=None, prefix=None, page_size=None):
+        """Yield (key, value) in key order, fetching a page at a time."""
+        # A bigger page would come back capped and pass for the last one
+        limit = min(page_size or self.SCAN_PAGE, SCAN_LIMIT)
+        params = {"start": start, "stop": stop, "prefix": prefix, "limit": limit}
+        while True:
+            page = self.request("SCAN", params)
+            for key, value in page:
+                yield key, value
+            if len(page) < params["limit"]:
+                return
+            params["after"] = page[-1][0]
+
+    def __len__(self):
+        return self.request("LEN")
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Pipeline:
+    """Queues commands and sends them together on execute().
+
+    Results come back in order as the plain client would return them; a missing
+    key from get() is None. If any command failed, execute() raises KVError
+    after reading every response, so the connection stays usable.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = []
+
+    def get(self, key):
+        self.requests.append(["GET", key])
+
+    def set(self, key, value):
+        self.requests.append(["SET", key, value])
+
+    def delete(self, key):
+        self.requests.append(["DEL", key])
+
+    def mget(self, keys):
+        self.requests.append(["MGET", list(keys)])
+
+    def mset(self, items):
+        self.requests.append(["MSET", dict(items)])
+
+    def mdel(self, keys):
+        self.requests.append(["MDEL", list(keys)])
+
+    def execute(self):
+        requests, self.requests = self.requests, []
+        if not requests:
+            return []
+        responses = self.client.call(*requests)
+        errors = [response[1] for response in responses if response[0] == "ERR"]
+        if errors:
+            raise KVError(f"{len(errors)} of {len(responses)} pipelined commands failed, first: {errors[0]}")
+        return [None if response[0] == "NOT_FOUND" else response[1] for response in responses]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.execute()
+
+def result(response):
+    if response[0] == "OK":
+        return response[1]
+    if response[0] == "ERR":
+        raise KVError(response[1])
+    raise KVError(f"Unexpected response {response!r}")
@@ -0,0 +1,51 @@
+import json
+
+# ============================
+# WIRE FORMAT
+# ============================
+#
+# Every message is a frame: a 4-byte big-endian length, then that many bytes of
+# payload (the same framing as send_message in tcp-chat.py). Payloads are UTF-8
+# JSON arrays.
+#
+# Requests                          Responses
+#   ["GET", key]                      ["OK", value] or ["NOT_FOUND"]
+#   ["SET", key, value]               ["OK", null]
+#   ["DEL", key]                      ["OK", true if the key existed]
+#   ["SCAN", {start, stop, prefix,    ["OK", [[key, value], ...]] in key order, at most
+#             after, limit}]            min(limit, SCAN_LIMIT); pass the last key back
+#                                       as "after" for the next page
+#   ["MGET", [key, ...]]              ["OK", {key: value}] for the keys that exist
+#   ["MSET", {key: value, ...}]       ["OK", keys written], as one transaction
+#   ["MDEL", [key, ...]]              ["OK", keys deleted], as one transaction
+#   ["LEN"]                           ["OK", number of keys]
+# Any request can instead get ["ERR", message].
+#
+# A client may send many requests without waiting; responses come back in order.
+
+DEFAULT_PORT = 7700
+HEADER_SIZE = 4
+MAX_FRAME = 64 * 1024 * 1024  # Anything bigger is a broken or hostile peer
+SCAN_LIMIT = 10000  # Most entries one SCAN returns
+
+def encode_frame(payload):
+    return len(payload).to_bytes(HEADER_SIZE, 'big') + payload
+
+def encode_message(message):
+    return encode_frame(json.dumps(message).encode())
+
+def split_frames(buffer):
+    """Decode the complete messages at the start of buffer.
+    Returns (messages, bytes consumed); a partial frame is left for later."""
+    messages = []
+    pos = 0
+    while len(buffer) - pos >= HEADER_SIZE:
+        length = int.from_bytes(buffer[pos:pos + HEADER_SIZE], 'big')
+        if length > MAX_FRAME:
+            raise ValueError(f"Frame of {length} bytes is over the {MAX_FRAME} byte limit")
+        end = pos + HEADER_SIZE + length
+        if end > len(buffer):
+            break
+        messages.append(json.loads(bytes(buffer[pos + HEADER_SIZE:end])))
+        pos = end
+    return messages, pos
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import threading
+
+from kvprotocol import DEFAULT_PORT, SCAN_LIMIT, encode_message, split_frames
+from pdict import PersistentDict
+from serializers import SERIALIZERS
+
+# ============================
+# KEY-VALUE SERVER
+# ============================
+
+class KVServer:
+    """Serves a PersistentDict over TCP with the kvprotocol framing.
+
+    One asyncio event loop handles every connection. Each read is split into all
+    the complete requests it holds, and their responses go back in one write,
+    so a client that pipelines thousands of requests pays for one round trip.
+    Mirrors the socketserver API (serve_forever / shutdown / server_close).
+    """
+
+    READ_SIZE = 256 * 1024
+    BACKLOG = 1024
+
+    def __init__(self, server_address, store):
+        self.server_address = server_address
+        self.store = store
+        self.loop = None
+        self.stopped = None
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        host, port = self.server_address
+        server = await asyncio.start_server(self.handle_connection, host, port, reuse_address=True,
+                                            backlog=self.BACKLOG)
+        async with server:
+            await self.stopped.wait()
+
+    def shutdown(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def server_close(self):
+        pass  # The listening socket is closed when serve() returns
+
+    async def handle_connection(self, reader, writer):
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(self.READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+                try:
+                    requests, consumed = split_frames(buffer)
+                except ValueError as e:
+                    writer.write(encode_message(["ERR", f"Bad frame: {e}"]))
+                    break
+                del buffer[:consumed]
+                if requests:
+                    writer.write(b"".join(encode_message(self.execute(request)) for request in requests))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ---------- Commands ----------
+
+    def execute(self, request):
+        """Run one request and return its response message."""
+        try:
+            command, params = request[0], request[1:]
+            handler = getattr(self, "op_" + str(command).lower(), None)
+            if handler is None:
+                return ["ERR", f"Unknown command {command!r}"]
+            return handler(*params)
+        except (TypeError, ValueError, IndexError, KeyError, AttributeError) as e:
+            return ["ERR", f"{type(e).__name__}: {e}"]
+
+    def op_get(self, key):
+        found = self.store.find(key)
+        if found is None:
+            return ["NOT_FOUND"]
+        return ["OK", found[1][2]]
+
+    def op_set(self, key, value):
+        self.store[key] = value
+        return ["OK", None]
+
+    def op_del(self, key):
+        try:
+            del self.store[key]
+        except KeyError:
+            return ["OK", False]
+        return ["OK", True]
+
+    def op_scan(self, params=None):
+        params = dict(params or {})
+        limit = params.get("limit")
+        params["limit"] = SCAN_LIMIT if limit is None else min(limit, SCAN_LIMIT)
+        return ["OK", [list(item) for item in self.store.scan(**params)]]
+
+    def op_mget(self, keys):
+        values = {}
+        for key in keys:
+            found = self.store.find(key)
+            if found is not None:
+                values[key] = found[1][2]
+        return ["OK", values]
+
+    def op_mset(self, items):
+        self.store.update(items)  # One transaction
+        return ["OK", len(items)]
+
+    def op_mdel(self, keys):
+        deleted = 0
+        with self.store.transaction() as tx:
+            for key in keys:
+                if key in tx:
+                    del tx[key]
+                    deleted += 1
+        return ["OK", deleted]
+
+    def op_len(self):
+        return ["OK", len(self.store)]
+
+# ============================
+# MAIN
+# ============================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the persistent dictionary over TCP")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data", default="Persistent Dictionary/data.db", help="Store to serve")
+    parser.add_argument("--format", choices=list(SERIALIZERS), default="binary",
+                        help="Log format if the store is created")
+    parser.add_argument("--fsync", action="store_true", help="fsync every write before answering it")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    store = PersistentDict(args.data, serializer=args.format, fsync=args.fsync)
+    server = KVServer((args.host, args.port), store)
+    print(f"Key-value server for {args.data} listening on {args.host}:{args.port}")
+    t1 = threading.Thread(target=server.serve_forever, daemon=True)
+    t1.start()
+
+    try:
+        input("Press ENTER to close...\n")
+    except EOFError:
+        pass  # stdin closed, shut down cleanly
+    server.shutdown()
+    t1.join()
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,683 @@
+import fcntl
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import struct
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from serializers import SERIALIZERS, detect
+from sortedkeys import SortedKeys
+
+# ============================
+# RECORD FORMAT
+# ============================
+#
+# The store is an append-only log of set, delete and transaction records (see
+# serializers.py for the JSON lines and binary encodings). A transaction is
+# appended with a single write, and if a crash leaves fewer than n records after
+# its ["b", n] marker the whole transaction is dropped.
+
+def key_hash(key):
+    """Stable 64-bit hash of a key (the built-in hash is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+# ============================
+# HASH INDEX FILE
+# ============================
+#
+# [header 64 B][slots: capacity x 16 B]
+#
+# header : magic, capacity, count (live keys), used (non-empty slots), records
+#          (log records, live or not), log_end (log bytes the index covers), seq,
+#          retired
+# slot   : key hash (u64), log offset + 1 (u64; 0 = empty, TOMBSTONE = deleted)
+#
+# The index is only a cache of the log. `seq` is odd while a write is updating
+# slots, so an index left odd by a crash is rebuilt from the log on open, and
+# records past log_end (appended just before a crash) are replayed into it.
+# Readers in other processes use `seq` as a seqlock, retrying a lookup if it was
+# odd or moved meanwhile. When the file is replaced (growth, compaction) the old
+# one is flagged retired so those readers reopen the index and the log.
+
+MAGIC = b"PDICTIX1"
+U64 = struct.Struct("<Q")
+SLOT = struct.Struct("<QQ")
+HEADER_SIZE = 64
+CAPACITY_AT, COUNT_AT, USED_AT, RECORDS_AT, LOG_END_AT, SEQ_AT, RETIRED_AT = 8, 16, 24, 32, 40, 48, 56
+
+EMPTY = 0
+TOMBSTONE = 2 ** 64 - 1
+MAX_LOAD = 0.7
+MIN_CAPACITY = 1024
+
+class HashIndex:
+    """Open-addressing key hash -> log offset table in a memory-mapped file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r+b') as f:
+            self.mm = mmap.mmap(f.fileno(), 0)
+        if len(self.mm) < HEADER_SIZE or self.mm[0:8] != MAGIC:
+            raise ValueError(f"{path} is not a PersistentDict index")
+        self.capacity = self.header(CAPACITY_AT)
+        if len(self.mm) != HEADER_SIZE + self.capacity * SLOT.size:
+            raise ValueError(f"{path} is truncated")
+
+    @classmethod
+    def create(cls, path, capacity):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.truncate(HEADER_SIZE + capacity * SLOT.size)
+        with open(tmp_path, 'r+b') as f:
+            mm = mmap.mmap(f.fileno(), 0)
+            mm[0:8] = MAGIC
+            U64.pack_into(mm, CAPACITY_AT, capacity)
+            mm.close()
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @staticmethod
+    def capacity_for(keys):
+        capacity = MIN_CAPACITY
+        while capacity * MAX_LOAD < keys * 2:
+            capacity *= 2
+        return capacity
+
+    def header(self, at):
+        return U64.unpack_from(self.mm, at)[0]
+
+    def set_header(self, at, value):
+        U64.pack_into(self.mm, at, value)
+
+    def probe(self, h):
+        """Yield (slot position, log offset) for every slot matching hash h,
+        then once more for the first free slot with offset None."""
+        mask = self.capacity - 1
+        i = h & mask
+        free = None
+        while True:
+            position = HEADER_SIZE + i * SLOT.size
+            slot_hash, stored = SLOT.unpack_from(self.mm, position)
+            if stored == EMPTY:
+                yield (free if free is not None else position), None
+                return
+            if stored == TOMBSTONE:
+                if free is None:
+                    free = position
+            elif slot_hash == h:
+                yield position, stored - 1
+            i = (i + 1) & mask
+
+    def write_slot(self, position, h, offset):
+        SLOT.pack_into(self.mm, position, h, TOMBSTONE if offset is None else offset + 1)
+
+    def offsets(self):
+        """Yield the log offset of every live slot."""
+        mm = self.mm
+        for i in range(self.capacity):
+            stored = SLOT.unpack_from(mm, HEADER_SIZE + i * SLOT.size)[1]
+            if stored != EMPTY and stored != TOMBSTONE:
+                yield stored - 1
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+
+    def retire(self):
+        """Tell processes still mapping this file that it was replaced. The map
+        is left for the garbage collector, as in PersistentDict.refresh(), since
+        lock-free readers in this process may still be probing it."""
+        self.set_header(RETIRED_AT, 1)
+        self.mm.flush()
+
+# ============================
+# PERSISTENT DICTIONARY
+# ============================
+
+DELETED = object()  # Marks a key deleted in a pending set of changes
+
+def dump_json(items, f):
+    """Write (key, value) pairs to f as a JSON object laid out like
+    json.dump(..., indent=4), one entry at a time."""
+    f.write("{")
+    separator = "\n"
+    for key, value in items:
+        text = json.dumps(value, indent=4).replace("\n", "\n    ")
+        f.write(f"{separator}    {json.dumps(key)}: {text}")
+        separator = ",\n"
+    f.write("\n}\n" if separator != "\n" else "}\n")
+
+class PersistentDict(MutableMapping):
+    """A dict that survives restarts, backed by an append-only record log.
+
+    Setting or deleting a key appends one record, so a write costs O(size of the
+    value) no matter how big the dictionary is. Keys are found through an on-disk
+    hash index that is memory-mapped, not loaded: opening the store only touches
+    the index header, and a lookup reads one record from the log and decodes just
+    that value. Overwritten and deleted records pile up in the log; once they
+    outnumber the live keys by compact_ratio the log is rewritten with only the
+    live entries. A separate sorted key index (see sortedkeys.py) serves scan()
+    in key order. Keys must be strings; values anything JSON can encode. A new
+    log is written with the named serializer ("json" or "binary"); an existing
+    one keeps the format it has until compact() is asked for another.
+
+    Any number of processes can open the same store. Writers take an exclusive
+    lock on path.lock for each write; lookups take no lock at all and read the
+    shared index directly, so they see other processes' commits immediately.
+    Scans take a shared lock just long enough to replay new keys from the log tail.
+    """
+
+    SPINS = 1000  # Odd seq reads before a reader suspects the writer died
+
+    def __init__(self, path, legacy_json=None, compact_ratio=2.0, compact_min=1000, fsync=False,
+                 serializer="json"):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min  # Don't bother compacting tiny logs
+        self.fsync = fsync
+        self.index = self.sorted_keys = None
+
+        self.lock_file = open(path + ".lock", 'a')
+        self.thread_lock = threading.RLock()  # flock doesn't exclude threads of one process
+        self.lock_depth = 0
+        self.exclusive = False
+        with self.locked(fcntl.LOCK_EX):
+            self.serializer = detect(path) or SERIALIZERS[serializer]
+            if not os.path.exists(path) and legacy_json and os.path.exists(legacy_json):
+                self.import_json(legacy_json)
+            self.log = open(path, 'ab+')
+            if self.log.tell() == 0:
+                self.log.write(self.serializer.header)
+                self.log.flush()
+            self.open_index()
+            self.open_sorted_keys()
+
+    # ---------- Locking ----------
+
+    @contextmanager
+    def locked(self, mode):
+        """Hold the store's file lock: fcntl.LOCK_SH to read consistently,
+        fcntl.LOCK_EX to write. A nested call reuses the lock already held."""
+        with self.thread_lock:
+            if self.lock_depth:
+                self.lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self.lock_depth -= 1
+                return
+
+            fcntl.flock(self.lock_file, mode)
+            self.lock_depth, self.exclusive = 1, mode == fcntl.LOCK_EX
+            try:
+                if self.index is not None:
+                    self.refresh()
+                    if self.exclusive:
+                        self.recover()
+                yield
+            finally:
+                self.lock_depth, self.exclusive = 0, False
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Reopen the index and log if another process replaced them."""
+        if not self.index.header(RETIRED_AT):
+            return
+        with self.locked(fcntl.LOCK_SH):
+            if self.index.header(RETIRED_AT):
+                # The old map and file are left for the garbage collector, as
+                # another thread may still be reading them
+                self.index = HashIndex(self.index_path)
+                self.log = open(self.path, 'ab+')
+                self.serializer = detect(self.path) or self.serializer  # Compaction may have converted it
+
+    def recover(self):
+        """Repair what a writer that died mid-write left behind. Caller holds the
+        exclusive lock, so nobody else is writing."""
+        if self.index.header(SEQ_AT) & 1:
+            self.open_index()
+        elif self.index.header(LOG_END_AT) != os.path.getsize(self.path):
+            if self.sorted_keys is not None:
+                self.sync_sorted_keys()  # So the records caught up follow on from it
+            self.catch_up()
+
+    # ---------- Loading ----------
+
+    def import_json(self, json_file):
+        """Create the log from a dictionary saved by the old JSON format."""
+        with open(json_file, 'r') as f:
+            try:
+                legacy = json.load(f)
+            except json.JSONDecodeError:
+                legacy = {}  # Handle case where file is empty or corrupted
+        self.write_log(legacy.items())
+
+    def open_index(self):
+        """Map the index, rebuilding it if it's missing or was left mid-update.
+        A map already open is dropped, not closed: other threads may be reading it."""
+        log_size = os.path.getsize(self.path)
+        try:
+            self.index = HashIndex(self.index_path)
+            if self.index.header(SEQ_AT) & 1 or self.index.header(LOG_END_AT) > log_size:
+                raise ValueError("index is stale")
+        except (OSError, ValueError):
+            self.rebuild_index()
+        self.catch_up()
+
+    def open_sorted_keys(self):
+        """Load the sorted key index and bring it up to date with the log."""
+        sorted_keys = self.sorted_keys = SortedKeys(self.path + ".keys")
+        log_end = self.index.header(LOG_END_AT)
+        if sorted_keys.load(log_end):
+            sorted_keys.remove_orphans()
+            self.replay_keys(log_end)
+        else:
+            sorted_keys.clear()
+            for key in self:
+                sorted_keys.add(key)
+                if sorted_keys.full():
+                    sorted_keys.flush(0)  # Covers none of the log until every key is in
+            sorted_keys.seen = log_end
+            sorted_keys.flush(log_end)
+
+    def sync_sorted_keys(self):
+        """Pick up runs and keys other processes wrote. Caller holds the lock."""
+        sorted_keys = self.sorted_keys
+        log_end = self.index.header(LOG_END_AT)
+        if sorted_keys.changed() and not sorted_keys.load(log_end):
+            sorted_keys.reset()  # Can't trust the runs, so fall back to the whole log
+        if sorted_keys.seen > log_end:
+            sorted_keys.reset()  # The log was compacted under us
+        self.replay_keys(log_end)
+
+    def replay_keys(self, log_end):
+        """Add the keys set between the sorted keys' `seen` offset and log_end."""
+        sorted_keys = self.sorted_keys
+        offset = max(sorted_keys.seen, len(self.serializer.header))
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for record, size in self.serializer.records(f, values=False):
+                if offset >= log_end:
+                    break
+                offset += size
+                if record[0] == "s":
+                    sorted_keys.add(record[1])
+                if self.exclusive and sorted_keys.full():
+                    sorted_keys.flush(offset)
+        sorted_keys.seen = max(offset, sorted_keys.seen)
+
+    def rebuild_index(self, capacity=None):
+        """Recreate the index from a full scan of the log."""
+        if self.index is not None:
+            self.index.retire()
+        index = HashIndex.create(self.index_path, capacity or MIN_CAPACITY)
+        # Odd until caught up, so lock-free readers wait for the whole index
+        # rather than miss keys it doesn't cover yet
+        index.set_header(SEQ_AT, 1)
+        self.index = index
+        self.catch_up()
+        self.index.set_header(SEQ_AT, self.index.header(SEQ_AT) + 1)  # Growth may have replaced it
+
+    def catch_up(self):
+        """Apply log records the index doesn't cover yet, and drop a torn tail."""
+        start = max(self.index.header(LOG_END_AT), len(self.serializer.header))
+        good_offset = start
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            records = self.serializer.records(f, values=False)  # Stops at a torn write from a crash
+            for record, size in records:
+                group = [(record, size)]
+                if record[0] == "b":
+                    group = list(itertools.islice(records, record[1]))
+                    if len(group) < record[1]:
+                        break  # Transaction cut short by a crash, drop all of it
+                    good_offset += size
+
+                for record, length in group:
+                    self.apply(record[0], record[1], good_offset, good_offset + length)
+                    good_offset += length
+
+        # Cut off a torn tail so new records aren't appended onto garbage
+        if good_offset != os.path.getsize(self.path):
+            self.log.truncate(good_offset)
+
+    # ---------- Index maintenance ----------
+
+    def apply(self, kind, key, offset, end):
+        """Point the index at a record of the given kind ("s" or "d") written at offset."""
+        index = self.index
+        if index.header(USED_AT) + 1 > index.capacity * MAX_LOAD:
+            self.grow_index()
+            index = self.index
+
+        h = key_hash(key)
+        for position, stored in index.probe(h):
+            if stored is None or self.read_key(stored) == key:
+                break
+        reused = SLOT.unpack_from(index.mm, position)[1] == TOMBSTONE
+
+        seq = index.header(SEQ_AT)
+        index.set_header(SEQ_AT, seq | 1)  # Already odd while an index is being rebuilt
+        if kind == "s":
+            index.write_slot(position, h, offset)
+            if stored is None:
+                index.set_header(COUNT_AT, index.header(COUNT_AT) + 1)
+                if not reused:
+                    index.set_header(USED_AT, index.header(USED_AT) + 1)
+        elif stored is not None:
+            index.write_slot(position, h, None)
+            index.set_header(COUNT_AT, index.header(COUNT_AT) - 1)
+        index.set_header(RECORDS_AT, index.header(RECORDS_AT) + 1)
+        index.set_header(LOG_END_AT, end)
+        index.set_header(SEQ_AT, seq + 2)
+
+        if self.sorted_keys is not None:
+            if kind == "s" and stored is None:
+                self.sorted_keys.add(key)
+            self.sorted_keys.seen = end
+            if self.sorted_keys.full():
+                self.sorted_keys.flush(end)
+
+    def grow_index(self):
+        """Rehash the live slots into a table sized for twice the live keys.
+        Slots keep their hash, so this never touches the log."""
+        old = self.index
+        bigger = HashIndex.create(self.index_path + ".new", HashIndex.capacity_for(old.header(COUNT_AT) + 1))
+        mask = bigger.capacity - 1
+        for i in range(old.capacity):
+            h, stored = SLOT.unpack_from(old.mm, HEADER_SIZE + i * SLOT.size)
+            if stored == EMPTY or stored == TOMBSTONE:
+                continue
+            j = h & mask
+            while SLOT.unpack_from(bigger.mm, HEADER_SIZE + j * SLOT.size)[1] != EMPTY:
+                j = (j + 1) & mask
+            SLOT.pack_into(bigger.mm, HEADER_SIZE + j * SLOT.size, h, stored)
+        for at in (COUNT_AT, RECORDS_AT, LOG_END_AT, SEQ_AT):
+            bigger.set_header(at, old.header(at))
+        bigger.set_header(USED_AT, old.header(COUNT_AT))
+        bigger.mm.flush()
+        os.replace(bigger.path, self.index_path)
+        bigger.path = self.index_path
+        old.retire()
+        self.index = bigger
+
+    # ---------- Log ----------
+
+    def read_record(self, offset):
+        """Decode the record starting at a log offset."""
+        log = self.log  # Keeps the file open through the read if another thread swaps it
+        return self.serializer.read_at(log.fileno(), offset)
+
+    def read_key(self, offset):
+        log = self.log
+        return self.serializer.read_key_at(log.fileno(), offset)
+
+    def find(self, key):
+        """Return (slot position, record) for a live key, or None.
+
+        Takes no lock: another process may be updating the index meanwhile, so
+        the lookup is retried until it ran while `seq` was even and unchanged.
+        """
+        if not isinstance(key, str):
+            return None
+        h = key_hash(key)
+        spins = 0
+        while True:
+            self.refresh()
+            index = self.index
+            seq = index.header(SEQ_AT)
+            if seq & 1:
+                spins += 1
+                if spins >= self.SPINS:
+                    # Blocks until the writer is done, and repairs the index if it died
+                    with self.locked(fcntl.LOCK_EX):
+                        pass
+                    spins = 0
+                continue
+            try:
+                found = self.probe(index, key, h)
+            except (ValueError, TypeError, IndexError):
+                found = None  # Torn read, the seq check below retries it
+            if index.header(SEQ_AT) == seq and not index.header(RETIRED_AT):
+                return found
+
+    def probe(self, index, key, h):
+        for position, stored in index.probe(h):
+            if stored is None:
+                return None
+            record = self.read_record(stored)
+            if record[1] == key:
+                return position, record
+        return None
+
+    def append(self, changes):
+        """Append {key: value or DELETED} to the log in one write and index it.
+        More than one change is written as a transaction."""
+        serializer = self.serializer
+        lines = [serializer.encode_delete(key) if value is DELETED else serializer.encode_set(key, value)
+                 for key, value in changes.items()]
+        if not lines:
+            return
+        begin = serializer.encode_begin(len(lines)) if len(lines) > 1 else b""
+
+        with self.locked(fcntl.LOCK_EX):
+            # Other writers may have added keys the sorted index must not lose
+            self.sync_sorted_keys()
+            offset = self.log.seek(0, os.SEEK_END)
+            self.log.write(begin + b"".join(lines))
+            self.log.flush()
+            if self.fsync:
+                os.fsync(self.log.fileno())
+
+            offset += len(begin)
+            for (key, value), line in zip(changes.items(), lines):
+                self.apply("d" if value is DELETED else "s", key, offset, offset + len(line))
+                offset += len(line)
+
+            records, count = self.index.header(RECORDS_AT), self.index.header(COUNT_AT)
+            if records >= self.compact_min and records > count * self.compact_ratio:
+                self.compact()
+
+    def write_log(self, items, serializer=None):
+        """Atomically replace the log with one set record per item."""
+        serializer = serializer or self.serializer
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(serializer.header)
+            for key, value in items:
+                f.write(serializer.encode_set(key, value))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def export_json(self, json_file):
+        """Write the dictionary as a JSON object, one entry at a time. The file is
+        replaced atomically, so a crash never leaves it half-written."""
+        tmp_path = json_file + ".tmp"
+        with open(tmp_path, 'w') as f:
+            dump_json(self.scan(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, json_file)
+
+    def compact(self, serializer=None):
+        """Rewrite the log with only the live entries and reindex it, converting
+        it to another serializer if one is named."""
+        with self.locked(fcntl.LOCK_EX):
+            capacity = HashIndex.capacity_for(len(self))
+            # The sorted keys cover log offsets that are about to change. Once cleared,
+            # reindexing the new log adds every key back and drops deleted ones.
+            self.sorted_keys.clear()
+            target = SERIALIZERS[serializer] if serializer is not None else self.serializer
+            self.write_log(self.items(), target)  # Readers keep using the old log's open file meanwhile
+
+            # Make lock-free readers in other threads retry from here on: the old index's
+            # offsets don't apply to the new log. The old file isn't closed, only left for
+            # the garbage collector like the retired index, as a reader may be mid-read.
+            self.index.set_header(SEQ_AT, self.index.header(SEQ_AT) + 1)
+            self.serializer = target
+            self.log = open(self.path, 'ab+')
+            self.rebuild_index(capacity)
+            self.sorted_keys.flush(self.sorted_keys.seen)  # Other processes reload from the manifest
+
+    # ---------- Mapping interface ----------
+
+    def __getitem__(self, key):
+        found = self.find(key)
+        if found is None:
+            raise KeyError(key)
+        return found[1][2]
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, str):
+            raise TypeError(f"PersistentDict keys must be str, not {type(key).__name__}")
+        self.append({key: value})
+
+    def __delitem__(self, key):
+        with self.locked(fcntl.LOCK_EX):
+            if self.find(key) is None:
+                raise KeyError(key)
+            self.append({key: DELETED})
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def __len__(self):
+        self.refresh()
+        return self.index.header(COUNT_AT)
+
+    def __iter__(self):
+        # Like a dict, the store must not be changed while it is being iterated.
+        # Writes from other processes meanwhile may or may not show up.
+        self.refresh()
+        for offset in self.index.offsets():
+            yield self.read_key(offset)
+
+    def items(self):
+        """(key, value) pairs, reading each record once."""
+        self.refresh()
+        for offset in self.index.offsets():
+            record = self.read_record(offset)
+            yield record[1], record[2]
+
+    def scan(self, start=None, stop=None, prefix=None, after=None, limit=None):
+        """Yield (key, value) in key order, reading one record at a time.
+
+        Covers start <= key < stop, or the keys beginning with prefix. For the
+        next page of a paginated scan, pass the last key seen as `after`.
+        Unlike iterating a dict, the store may be written meanwhile: the keys come
+        from the sorted index as it was when the scan started, and each value is
+        read as it is when its key comes up.
+        """
+        lower = max((bound for bound in (start, prefix, after) if bound is not None), default="")
+        with self.locked(fcntl.LOCK_SH):
+            self.sync_sorted_keys()
+            keys = self.sorted_keys.scan(lower)
+        found = 0
+        for key in keys:
+            if limit is not None and found >= limit:
+                return
+            if stop is not None and key >= stop:
+                return
+            if prefix is not None and not key.startswith(prefix):
+                return
+            if key == after:
+                continue
+            entry = self.find(key)
+            if entry is None:
+                continue  # Deleted since the key was indexed
+            found += 1
+            yield key, entry[1][2]
+
+    def update(self, other=(), **kwargs):
+        """Like dict.update, but committed as one transaction."""
+        with self.transaction() as tx:
+            tx.update(other, **kwargs)
+
+    def transaction(self):
+        """Start a Transaction. Used as a context manager it commits on success."""
+        return Transaction(self)
+
+    def close(self):
+        with self.locked(fcntl.LOCK_EX):
+            self.sync_sorted_keys()
+            self.sorted_keys.close(self.sorted_keys.seen)
+        self.index.close()
+        self.log.close()
+        self.lock_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ============================
+# TRANSACTIONS
+# ============================
+
+class Transaction(MutableMapping):
+    """A batch of changes to a PersistentDict that commits all at once.
+
+    Sets and deletes are buffered here (reads see them) and commit() appends them
+    to the log with a single write, so a crash keeps either all of them or none,
+    and a bulk load costs one write instead of one per key. As a context manager
+    it commits when the block succeeds and rolls back if it raises.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.changes = {}  # key -> new value, or DELETED
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            value = self.changes[key]
+            if value is DELETED:
+                raise KeyError(key)
+            return value
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, str):
+            raise TypeError(f"PersistentDict keys must be str, not {type(key).__name__}")
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.store:
+            self.changes[key] = DELETED
+        else:
+            del self.changes[key]  # Only ever set in this transaction
+
+    def __iter__(self):
+        for key in self.store:
+            if key not in self.changes:
+                yield key
+        for key, value in self.changes.items():
+            if value is not DELETED:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def commit(self):
+        changes, self.changes = self.changes, {}
+        self.store.append(changes)
+
+    def rollback(self):
+        self.changes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
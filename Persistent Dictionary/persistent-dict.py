@@ -1,35 +1,58 @@
 import json
-import os
+import sys
 
-DATA_FILE = "Persistent Dictionary/data.json"
+from pdict import PersistentDict, dump_json
 
-# Ensure the data file exists
-if not os.path.exists(DATA_FILE):
-    with open(DATA_FILE, 'w') as f:
-        json.dump({}, f)
+DATA_FILE = "Persistent Dictionary/data.db"
+LEGACY_FILE = "Persistent Dictionary/data.json"  # Imported once if data.db doesn't exist yet
+LOG_FORMAT = "binary"  # For a new data.db; convert.py rewrites an existing one
+PAGE_SIZE = 20  # Keys shown per page by 'find'
 
-# Load existing data
-with open(DATA_FILE, 'r') as f:
-    try:
-        data = json.load(f)
-    except json.JSONDecodeError:
-        data = {}  # Handle case where file is empty or corrupted
-
-def save_data():
-    """Save dictionary data to file."""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+data = PersistentDict(DATA_FILE, legacy_json=LEGACY_FILE, serializer=LOG_FORMAT)
 
 while True:
     print("\nPersistent dictionary")
-    print("Insert 'log' to view records | 'q' to exit")
+    print("Insert 'log' to view records | 'find <prefix>' to search keys | 'import <file>' / 'export <file>' for JSON | 'q' to exit")
     key = input("Enter a key: ").strip()
 
     if key == 'q':
-        save_data()
+        data.close()
         break
     if key == 'log':
-        print(json.dumps(data, indent=4))  # Pretty-print dictionary
+        dump_json(data.scan(), sys.stdout)  # Pretty-print dictionary in key order, one entry at a time
+        continue
+    if key.startswith('find '):
+        prefix = key[len('find '):]
+        after = None
+        while True:
+            page = list(data.scan(prefix=prefix, after=after, limit=PAGE_SIZE))
+            for found_key, value in page:
+                print(f"{found_key}: {value}")
+            if not page:
+                print("No keys found.")
+            if len(page) < PAGE_SIZE or input("Show more? (s/n): ").strip().lower() != "s":
+                break
+            after = page[-1][0]
+        continue
+    if key.startswith('import '):
+        path = key[len('import '):].strip()
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+            data.update({str(k): v for k, v in entries.items()})  # One transaction
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Could not import {path}: {e}")
+            continue
+        print(f"Imported {len(entries)} keys from {path}.")
+        continue
+    if key.startswith('export '):
+        path = key[len('export '):].strip()
+        try:
+            data.export_json(path)
+        except OSError as e:
+            print(f"Could not export to {path}: {e}")
+            continue
+        print(f"Exported {len(data)} keys to {path}.")
         continue
 
     if key in data:
@@ -39,6 +62,5 @@ while True:
             continue
 
     value = input("Enter a value: ").strip()
-    data[key] = value
-    save_data()  # Save immediately after modification
-    print(f"Key '{key}' updated successfully.")
\ No newline at end of file
+    data[key] = value  # Appended to the log immediately
+    print(f"Key '{key}' updated successfully.")
@@ -0,0 +1,287 @@
+import json
+import os
+import struct
+import zlib
+
+# ============================
+# RECORDS
+# ============================
+#
+# The log is a sequence of records, each decoded to a list:
+#   ["s", key, value]   set key to value
+#   ["d", key]          delete key
+#   ["b", n]            the next n records are one transaction
+# A serializer turns those lists into bytes and back. Replaying the log from
+# the start rebuilds the dictionary; a record cut short by a crash ends it.
+
+class JsonLines:
+    """One JSON array per line. Easy to read and grep, but big and slow to parse."""
+
+    name = "json"
+    header = b""
+    READ_SIZE = 4096  # First guess at a record's size when reading it back
+
+    def encode_set(self, key, value):
+        return json.dumps(["s", key, value]).encode() + b"\n"
+
+    def encode_delete(self, key):
+        return json.dumps(["d", key]).encode() + b"\n"
+
+    def encode_begin(self, count):
+        return json.dumps(["b", count]).encode() + b"\n"
+
+    def read_at(self, fd, offset):
+        """Decode the record starting at a log offset."""
+        size = self.READ_SIZE
+        while True:
+            chunk = os.pread(fd, size, offset)
+            end = chunk.find(b"\n")
+            if end != -1:
+                return json.loads(chunk[:end])
+            if len(chunk) < size:
+                raise ValueError(f"Truncated record at offset {offset}")
+            size *= 4
+
+    def read_key_at(self, fd, offset):
+        return self.read_at(fd, offset)[1]
+
+    def records(self, f, values=True):
+        """Yield (record, size in bytes) from f's position up to a torn or garbled record.
+        Records of this format always come with their value."""
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            yield record, len(line)
+
+# ============================
+# BINARY FORMAT
+# ============================
+#
+# file   : magic, then records
+# record : body length (varint), crc32 of body (u32), body
+# body   : kind byte (s, d, b), then key length (varint) + UTF-8 key for s and d,
+#          then the value for s; the record count (varint) for b
+# value  : tag byte, then
+#          0 None, 1 False, 2 True,
+#          3 int    zigzag varint
+#          4 float  f64
+#          5 str    length (varint) + UTF-8
+#          6 list   count (varint) + values
+#          7 dict   count (varint) + (key length (varint) + UTF-8 key, value) pairs
+#
+# Values are the ones JSON can hold, and come back as JSON would return them.
+# The crc catches a torn record even if the file was extended with zeros.
+
+CRC = struct.Struct("<I")
+FLOAT = struct.Struct("<d")
+NONE, FALSE, TRUE, INT, FLOAT_TAG, STR, LIST, DICT = range(8)
+
+def encode_varint(number, out):
+    while number >= 0x80:
+        out.append((number & 0x7f) | 0x80)
+        number >>= 7
+    out.append(number)
+
+def decode_varint(data, pos):
+    """(number, position after it). IndexError if data ends mid-varint."""
+    number = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, pos
+        shift += 7
+
+def encode_text(text, out):
+    encoded = text.encode()
+    encode_varint(len(encoded), out)
+    out += encoded
+
+def encode_value(value, out):
+    if value is None:
+        out.append(NONE)
+    elif value is True:
+        out.append(TRUE)
+    elif value is False:
+        out.append(FALSE)
+    elif isinstance(value, int):
+        out.append(INT)
+        encode_varint(value * 2 if value >= 0 else -value * 2 - 1, out)
+    elif isinstance(value, float):
+        out.append(FLOAT_TAG)
+        out += FLOAT.pack(value)
+    elif isinstance(value, str):
+        out.append(STR)
+        encode_text(value, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(LIST)
+        encode_varint(len(value), out)
+        for item in value:
+            encode_value(item, out)
+    elif isinstance(value, dict):
+        out.append(DICT)
+        encode_varint(len(value), out)
+        for key, item in value.items():
+            if not isinstance(key, str):
+                if not isinstance(key, (int, float, bool)) and key is not None:
+                    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key).__name__}")
+                key = json.dumps(key)  # Same as JSON would store it
+            encode_text(key, out)
+            encode_value(item, out)
+    else:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def decode_text(data, pos):
+    length, pos = decode_varint(data, pos)
+    if pos + length > len(data):
+        raise IndexError("string runs past the record")
+    return str(data[pos:pos + length], 'utf-8'), pos + length
+
+def decode_value(data, pos):
+    """(value, position after it)."""
+    tag = data[pos]
+    pos += 1
+    if tag == STR:
+        return decode_text(data, pos)
+    if tag == INT:
+        number, pos = decode_varint(data, pos)
+        return (number >> 1) ^ -(number & 1), pos
+    if tag == NONE:
+        return None, pos
+    if tag == TRUE:
+        return True, pos
+    if tag == FALSE:
+        return False, pos
+    if tag == FLOAT_TAG:
+        return FLOAT.unpack_from(data, pos)[0], pos + FLOAT.size
+    if tag == LIST:
+        count, pos = decode_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == DICT:
+        count, pos = decode_varint(data, pos)
+        items = {}
+        for _ in range(count):
+            key, pos = decode_text(data, pos)
+            items[key], pos = decode_value(data, pos)
+        return items, pos
+    raise ValueError(f"Unknown value tag {tag}")
+
+class Binary:
+    """Length-prefixed binary records: smaller than JSON lines and faster to load."""
+
+    name = "binary"
+    header = b"PDLOGB1\n"
+    READ_SIZE = 4096
+    MAX_RECORD = 1 << 31  # A bigger length can only be garbage
+
+    def frame(self, body):
+        out = bytearray()
+        encode_varint(len(body), out)
+        out += CRC.pack(zlib.crc32(body))
+        out += body
+        return bytes(out)
+
+    def encode_set(self, key, value):
+        body = bytearray(b"s")
+        encode_text(key, body)
+        encode_value(value, body)
+        return self.frame(body)
+
+    def encode_delete(self, key):
+        body = bytearray(b"d")
+        encode_text(key, body)
+        return self.frame(body)
+
+    def encode_begin(self, count):
+        body = bytearray(b"b")
+        encode_varint(count, body)
+        return self.frame(body)
+
+    def decode_body(self, body, values=True):
+        kind = chr(body[0])
+        if kind == "b":
+            return [kind, decode_varint(body, 1)[0]]
+        key, pos = decode_text(body, 1)
+        if kind == "d" or (kind == "s" and not values):
+            return [kind, key]
+        if kind == "s":
+            return [kind, key, decode_value(body, pos)[0]]
+        raise ValueError(f"Unknown record kind {kind!r}")
+
+    def read_key_at(self, fd, offset):
+        """Decode just the key of the record starting at a log offset."""
+        chunk = os.pread(fd, self.READ_SIZE, offset)
+        try:
+            start = decode_varint(chunk, 0)[1] + CRC.size + 1
+            return decode_text(chunk, start)[0]
+        except IndexError:
+            return self.read_at(fd, offset)[1]  # A key longer than the first read
+
+    def read_at(self, fd, offset):
+        """Decode the record starting at a log offset."""
+        chunk = os.pread(fd, self.READ_SIZE, offset)
+        try:
+            length, start = decode_varint(chunk, 0)
+        except IndexError:
+            raise ValueError(f"Truncated record at offset {offset}")
+        end = start + CRC.size + length
+        if end > len(chunk):
+            chunk += os.pread(fd, end - len(chunk), offset + len(chunk))
+            if end > len(chunk):
+                raise ValueError(f"Truncated record at offset {offset}")
+        return self.decode_body(chunk[start + CRC.size:end])
+
+    def records(self, f, values=True):
+        """Yield (record, size in bytes) from f's position up to a torn or garbled record.
+        With values off, set records come without their value, which is faster."""
+        data = b""
+        pos = 0
+        while True:
+            try:
+                length, start = decode_varint(data, pos)
+                if length > self.MAX_RECORD:
+                    return
+                end = start + CRC.size + length
+                if end > len(data):
+                    raise IndexError("record runs past the buffer")
+            except IndexError:
+                more = f.read(max(65536, len(data) - pos))
+                if not more:
+                    return  # End of the log, or a torn record at its end
+                data = data[pos:] + more
+                pos = 0
+                continue
+
+            body = data[start + CRC.size:end]
+            if CRC.unpack_from(data, start)[0] != zlib.crc32(body):
+                return
+            try:
+                record = self.decode_body(body, values)
+            except (ValueError, IndexError, UnicodeDecodeError):
+                return
+            yield record, end - pos
+            pos = end
+
+SERIALIZERS = {serializer.name: serializer for serializer in (JsonLines(), Binary())}
+
+def detect(path):
+    """The serializer an existing log was written with, or None if it's empty or missing."""
+    try:
+        with open(path, 'rb') as f:
+            start = f.read(len(Binary.header))
+    except FileNotFoundError:
+        return None
+    if not start:
+        return None
+    if start == Binary.header:
+        return SERIALIZERS["binary"]
+    return SERIALIZERS["json"]
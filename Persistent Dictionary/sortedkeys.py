@@ -0,0 +1,234 @@
+import glob
+import heapq
+import json
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from bisect import bisect_left
+
+# ============================
+# RUN FILE FORMAT
+# ============================
+#
+# [keys: (length u32, utf-8 bytes) ...][offsets: count x u64][footer: count, offsets_at, magic]
+#
+# Keys are sorted by their UTF-8 bytes, which is the same order Python sorts the
+# strings in. A run is written front to back in one pass (the offsets go to a
+# temp file until the keys are done), so writing or merging runs never holds
+# more than one key per run in memory.
+
+MAGIC = b"PDKEYS01"
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+FOOTER = struct.Struct("<QQ8s")
+
+class SortedRun:
+    """A read-only, memory-mapped file of sorted distinct keys."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < FOOTER.size:
+                raise ValueError(f"{path} is truncated")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count, self.offsets_at, magic = FOOTER.unpack_from(self.mm, len(self.mm) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a sorted key run")
+
+    @classmethod
+    def write(cls, path, keys):
+        """Write an iterable of sorted, distinct key bytes as a run file."""
+        tmp_path = path + ".tmp"
+        count = position = 0
+        with open(tmp_path, 'wb') as f, tempfile.TemporaryFile() as offsets:
+            for key in keys:
+                offsets.write(U64.pack(position))
+                f.write(U32.pack(len(key)))
+                f.write(key)
+                position += U32.size + len(key)
+                count += 1
+            offsets.seek(0)
+            shutil.copyfileobj(offsets, f)
+            f.write(FOOTER.pack(count, position, MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def key_at(self, i):
+        offset = U64.unpack_from(self.mm, self.offsets_at + i * U64.size)[0]
+        length = U32.unpack_from(self.mm, offset)[0]
+        return self.mm[offset + U32.size:offset + U32.size + length]
+
+    def lower_bound(self, key):
+        """Index of the first key >= key."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def keys_from(self, start):
+        for i in range(self.lower_bound(start), self.count):
+            yield self.key_at(i)
+
+    def close(self):
+        self.mm.close()
+
+def unique(keys):
+    """Drop consecutive duplicates from a sorted iterable."""
+    previous = None
+    for key in keys:
+        if key != previous:
+            yield key
+            previous = key
+
+# ============================
+# SORTED KEY INDEX
+# ============================
+
+class SortedKeys:
+    """Every key of a PersistentDict in sorted order, for range and prefix scans.
+
+    New keys collect in a sorted in-memory list; once it holds DELTA_MAX keys it
+    is written out as a run file, and runs of similar size are merged so there
+    are only O(log n) of them. A scan merges the runs and the list lazily, so it
+    needs one key per run in memory however big the store is.
+
+    Runs may still hold keys deleted since they were written: callers filter
+    keys against the hash index, and compaction rebuilds the runs from scratch.
+    The manifest lists the runs and how much of the log they cover; the caller
+    replays records past that with add(). Every process sharing a store keeps
+    its own list of recent keys, but only the writer holding the store's lock
+    writes runs and the manifest; others reload the manifest when it changes.
+    """
+
+    DELTA_MAX = 65536
+
+    def __init__(self, path):
+        self.path = path  # The manifest; runs are path.<id>
+        self.runs = []
+        self.delta = []  # Sorted key bytes not in any run yet
+        self.next_id = 0
+        self.log_end = 0  # Log bytes the runs on disk cover
+        self.seen = 0  # Log bytes the runs and the in-memory list cover
+        self.stamp = None  # Identity of the manifest last loaded or saved
+
+    def run_path(self, run_id):
+        return f"{self.path}.{run_id}"
+
+    def load(self, log_size):
+        """Open the runs listed in the manifest. False if they can't be trusted."""
+        try:
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+            runs = [SortedRun(self.run_path(run_id)) for run_id in manifest["runs"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        if manifest["log_end"] > log_size:
+            for run in runs:
+                run.close()
+            return False
+
+        # Runs replaced here are left for the garbage collector to unmap, in case
+        # a scan is still reading them
+        self.runs, self.next_id, self.log_end = runs, manifest["next_id"], manifest["log_end"]
+        self.delta, self.seen = [], self.log_end
+        self.stamp = self.manifest_stamp()
+        return True
+
+    def manifest_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def changed(self):
+        """Whether another process saved the manifest since this one last did."""
+        return self.manifest_stamp() != self.stamp
+
+    def remove_orphans(self):
+        """Delete run files the manifest doesn't list. Only safe for the writer."""
+        keep = {run.path for run in self.runs} | {self.path}
+        for path in glob.glob(glob.escape(self.path) + ".*"):
+            if path not in keep:
+                os.remove(path)  # Left over from a crash mid-merge
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        manifest = {
+            "runs": [int(run.path.rsplit(".", 1)[1]) for run in self.runs],
+            "next_id": self.next_id,
+            "log_end": self.log_end,
+        }
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.path)
+        self.stamp = self.manifest_stamp()
+
+    def reset(self):
+        """Forget every key in memory, leaving the files alone."""
+        self.runs, self.delta, self.log_end, self.seen = [], [], 0, 0
+
+    def clear(self):
+        """Forget every key and delete the manifest and runs. The runs stay mapped
+        until the garbage collector gets them, as a scan may still be reading them."""
+        self.reset()
+        self.next_id = 0
+        for path in glob.glob(glob.escape(self.path) + "*"):
+            os.remove(path)
+
+    # ---------- Writes ----------
+
+    def add(self, key):
+        """Record a key that was set. The caller advances `seen` past its record."""
+        key_bytes = key.encode()
+        i = bisect_left(self.delta, key_bytes)
+        if i == len(self.delta) or self.delta[i] != key_bytes:
+            self.delta.insert(i, key_bytes)
+
+    def full(self):
+        return len(self.delta) >= self.DELTA_MAX
+
+    def write_run(self, keys):
+        run = SortedRun.write(self.run_path(self.next_id), keys)
+        self.next_id += 1
+        return run
+
+    def flush(self, log_end):
+        """Write the pending keys as a run and note that the log up to log_end is covered."""
+        retired = []
+        if self.delta:
+            self.runs.append(self.write_run(self.delta))
+            self.delta = []
+            # Merge while the newest run is at least half the size of the one before
+            while len(self.runs) >= 2 and self.runs[-2].count <= 2 * self.runs[-1].count:
+                newer, older = self.runs.pop(), self.runs.pop()
+                self.runs.append(self.write_run(unique(heapq.merge(older.keys_from(b""), newer.keys_from(b"")))))
+                retired += [older, newer]
+        self.log_end = log_end
+        self.save()
+        for run in retired:
+            os.remove(run.path)  # Unmapped by the garbage collector once no scan reads it
+
+    # ---------- Reads ----------
+
+    def scan(self, start=""):
+        """Iterate keys >= start in sorted order. Keys may have been deleted since.
+        The scan keeps reading the runs and pending keys it started with, so
+        writes meanwhile (even ones that merge or clear runs) don't disturb it."""
+        start_bytes = start.encode()
+        sources = [run.keys_from(start_bytes) for run in self.runs]
+        sources.append(self.delta[bisect_left(self.delta, start_bytes):])
+        return (key.decode() for key in unique(heapq.merge(*sources)))
+
+    def close(self, log_end):
+        self.flush(log_end)
+        for run in self.runs:
+            run.close()
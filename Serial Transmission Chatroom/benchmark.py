@@ -0,0 +1,347 @@
+import argparse
+import json
+import multiprocessing
+import random
+import selectors
+import socket
+import sys
+import threading
+import time
+
+from chathub import SLOW_POLICIES, ChatHub, raise_fd_limit
+from compression import Compression, hello
+from framing import FLAG_COMPRESSED, FLAG_CONTROL, FrameReader
+
+# ============================
+# CONFIGURATION
+# ============================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the chat transports over loopback and report JSON results")
+    parser.add_argument("--transport", choices=list(TRANSPORTS) + ["all"], default="all")
+    parser.add_argument("--peers", default="2,16,128",
+                        help="Comma-separated peer counts; the direct transport only runs with 2")
+    parser.add_argument("--sizes", default=",".join(SIZE_DISTRIBUTIONS),
+                        help=f"Comma-separated message size distributions: {', '.join(SIZE_DISTRIBUTIONS)}")
+    parser.add_argument("--messages", type=int, default=5000, help="Messages broadcast per throughput run")
+    parser.add_argument("--byte-budget", type=float, default=64e6,
+                        help="Send fewer messages if the run would deliver more bytes than this")
+    parser.add_argument("--pings", type=int, default=500, help="Round trips timed per latency run")
+    parser.add_argument("--idle-timeout", type=float, default=5.0,
+                        help="Stop waiting for messages after this many idle seconds")
+    parser.add_argument("--compress", action="store_true", help="Peers negotiate compression")
+    parser.add_argument("--max-queue", type=int, default=1000, help="Hub: messages queued per slow client")
+    parser.add_argument("--max-queue-bytes", type=int, default=1024 * 1024, help="Hub: bytes queued per slow client")
+    parser.add_argument("--slow-policy", choices=SLOW_POLICIES, default="drop-oldest")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Report progress on stderr as each case finishes")
+    return parser.parse_args()
+
+# Message sizes in bytes. "chat" is log-normal: mostly short lines, now and
+# then a long paste.
+SIZE_DISTRIBUTIONS = {
+    "tiny": lambda rng: 16,
+    "chat": lambda rng: min(4096, max(8, int(rng.lognormvariate(4.0, 0.9)))),
+    "1k": lambda rng: 1024,
+    "64k": lambda rng: 65536,
+}
+
+WORDS = ("hello there how is it going see you at the meeting later today ok "
+         "sounds good thanks I will send the file when it is ready lol yes no maybe").split()
+
+# ============================
+# TRANSPORTS
+# ============================
+#
+# A transport connects a number of peers over loopback; a message sent on one
+# socket reaches every other one. The last socket connected is the last returned.
+
+def serve_hub(ready, args):
+    raise_fd_limit()
+    hub = ChatHub(("127.0.0.1", 0), args.max_queue, args.max_queue_bytes, args.slow_policy)
+    ready.put(hub.listener.getsockname()[1])
+    hub.serve_forever()
+
+class HubTransport:
+    """chathub.ChatHub in its own process, so it doesn't share a GIL with the peers."""
+
+    def __init__(self, args):
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        self.process = context.Process(target=serve_hub, args=(ready, args), daemon=True)
+        self.process.start()
+        self.address = ("127.0.0.1", ready.get(timeout=30))
+
+    def connect(self, count):
+        return [connect(self.address) for _ in range(count)]
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
+
+class DirectTransport:
+    """Two peers on one TCP connection, as tcp-chat.py runs without a hub."""
+
+    def __init__(self, args):
+        pass
+
+    def connect(self, count):
+        if count != 2:
+            raise ValueError("The direct transport connects exactly 2 peers")
+        with socket.create_server(("127.0.0.1", 0)) as listener:
+            a = connect(listener.getsockname())
+            b, _ = listener.accept()
+        b.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return [b, a]
+
+    def close(self):
+        pass
+
+TRANSPORTS = {"direct": DirectTransport, "hub": HubTransport}
+
+def connect(address):
+    sock = socket.create_connection(address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # As an interactive client should
+    return sock
+
+# ============================
+# MEASUREMENTS
+# ============================
+
+def make_corpus(rng, size=1 << 20):
+    text = " ".join(rng.choice(WORDS) for _ in range(size // 3)).encode()
+    return text[:size]
+
+def make_payload(rng, corpus, size):
+    start = rng.randrange(len(corpus) - size) if size < len(corpus) else 0
+    return corpus[start:start + size]
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+class Peer:
+    """One simulated chat client: its socket, frame reader and compression state."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = FrameReader()
+        self.compression = Compression()
+        self.count = 0
+
+    def messages(self):
+        """Yield the payload of each chat message read so far, inflated if need be."""
+        for flags, payload in self.reader.frames():
+            if flags & FLAG_CONTROL:
+                self.compression.on_hello(payload)
+                continue
+            if flags & FLAG_COMPRESSED:
+                payload = self.compression.decode(payload)
+            yield payload
+
+    def send(self, payload):
+        self.sock.sendall(self.compression.encode(payload))
+
+def join(transport, count, args):
+    """Connect count peers, agreeing on compression first if asked to."""
+    peers = [Peer(sock) for sock in transport.connect(count)]
+    if args.compress:
+        for peer in peers:
+            peer.sock.sendall(hello())
+        for peer in peers:
+            peer.sock.settimeout(args.idle_timeout)
+            while not peer.compression.enabled:
+                if not peer.reader.read_from(peer.sock):
+                    raise ConnectionError("Transport closed the connection mid-benchmark")
+                for _ in peer.messages():
+                    pass
+            peer.sock.settimeout(None)
+    return peers
+
+def drain(peers, expected, idle_timeout):
+    """Read from every peer until each has had `expected` messages or nothing
+    arrives for idle_timeout. Returns (messages, payload bytes, bytes on the
+    wire, time of the last read)."""
+    selector = selectors.DefaultSelector()
+    for peer in peers:
+        peer.sock.setblocking(False)
+        peer.count = 0
+        selector.register(peer.sock, selectors.EVENT_READ, peer)
+    messages = payload_bytes = wire_bytes = 0
+    last = time.perf_counter()
+    remaining = len(peers)
+    while remaining:
+        events = selector.select(idle_timeout)
+        if not events:
+            break
+        for key, _ in events:
+            peer = key.data
+            try:
+                received = peer.reader.read_from(peer.sock)
+            except BlockingIOError:
+                continue
+            except ConnectionError:
+                received = 0
+            wire_bytes += received
+            for payload in peer.messages():
+                peer.count += 1
+                messages += 1
+                payload_bytes += len(payload)
+            if not received or peer.count >= expected:
+                selector.unregister(peer.sock)
+                remaining -= 1
+        last = time.perf_counter()
+    selector.close()
+    for peer in peers:
+        peer.sock.setblocking(True)
+    return messages, payload_bytes, wire_bytes, last
+
+def throughput(transport, peers, sizes, rng, corpus, args):
+    """One peer broadcasts as fast as it can; the rest count what reaches them."""
+    everyone = join(transport, peers, args)
+    receivers, sender = everyone[:-1], everyone[-1]
+
+    # Make sure every receiver is in the room before the clock starts
+    sender.send(b"ready")
+    drain(receivers, 1, args.idle_timeout)
+
+    mean_size = sum(sizes(rng) for _ in range(1000)) / 1000
+    messages = max(10, min(args.messages, int(args.byte_budget / (mean_size * (peers - 1)))))
+    payloads = [make_payload(rng, corpus, sizes(rng)) for _ in range(messages)]
+
+    sent_at = []
+    def send():
+        sender.sock.sendall(b"".join(sender.compression.encode(payload) for payload in payloads))
+        sent_at.append(time.perf_counter())
+    started = time.perf_counter()
+    t1 = threading.Thread(target=send, daemon=True)
+    t1.start()
+    delivered, payload_bytes, wire_bytes, finished = drain(receivers, messages, args.idle_timeout)
+    t1.join()
+    elapsed = finished - started
+
+    for peer in everyone:
+        peer.sock.close()
+    expected = messages * (peers - 1)
+    return {
+        "messages": messages,
+        "deliveries": delivered,
+        "delivered_ratio": delivered / expected,
+        "duration_s": elapsed,
+        "send_msgs_per_s": messages / (sent_at[0] - started),
+        "msgs_per_s": delivered / elapsed,
+        "bytes_per_s": payload_bytes / elapsed,
+        "wire_bytes_per_s": wire_bytes / elapsed,
+        "wire_ratio": wire_bytes / payload_bytes if payload_bytes else 0.0,
+    }
+
+def latency(transport, peers, sizes, rng, corpus, args):
+    """One peer pings, another echoes each ping back; the rest only listen,
+    so every round trip also pays for the fan-out to them."""
+    everyone = join(transport, peers, args)
+    listeners, echo, origin = everyone[:-2], everyone[-2], everyone[-1]
+
+    def echo_back():
+        try:
+            while echo.reader.read_from(echo.sock):
+                for payload in echo.messages():
+                    echo.send(payload)
+        except OSError:
+            pass
+    t1 = threading.Thread(target=echo_back, daemon=True)
+    t1.start()
+    t2 = threading.Thread(target=drain, args=(listeners, 2 * args.pings, args.idle_timeout), daemon=True)
+    t2.start()
+
+    origin.sock.settimeout(args.idle_timeout)
+    round_trips = []
+    for i in range(args.pings):
+        payload = i.to_bytes(4, 'big') + make_payload(rng, corpus, max(0, sizes(rng) - 4))
+        started = time.perf_counter()
+        origin.send(payload)
+        answered = False
+        while not answered:
+            if not origin.reader.read_from(origin.sock):
+                raise ConnectionError("Transport closed the connection mid-benchmark")
+            answered = any(int.from_bytes(reply[:4], 'big') == i for reply in origin.messages())
+        round_trips.append(time.perf_counter() - started)
+
+    echo.sock.shutdown(socket.SHUT_RDWR)  # Wakes echo_back, which close() alone would not
+    t1.join()
+    t2.join()
+    for peer in everyone:
+        peer.sock.close()
+
+    round_trips.sort()
+    ms = 1000
+    return {
+        "pings": len(round_trips),
+        "mean": sum(round_trips) / len(round_trips) * ms,
+        "p50": percentile(round_trips, 0.50) * ms,
+        "p90": percentile(round_trips, 0.90) * ms,
+        "p99": percentile(round_trips, 0.99) * ms,
+        "max": round_trips[-1] * ms,
+    }
+
+# ============================
+# MAIN
+# ============================
+
+def main():
+    args = parse_args()
+    raise_fd_limit()
+    transports = list(TRANSPORTS) if args.transport == "all" else [args.transport]
+    peer_counts = [int(peers) for peers in args.peers.split(",")]
+    size_names = args.sizes.split(",")
+    for name in size_names:
+        if name not in SIZE_DISTRIBUTIONS:
+            raise SystemExit(f"Unknown size distribution {name!r}")
+
+    rng = random.Random(args.seed)
+    corpus = make_corpus(rng)
+    report = {
+        "config": {
+            "transports": transports,
+            "peers": peer_counts,
+            "sizes": size_names,
+            "messages": args.messages,
+            "byte_budget": args.byte_budget,
+            "pings": args.pings,
+            "compress": args.compress,
+            "max_queue": args.max_queue,
+            "max_queue_bytes": args.max_queue_bytes,
+            "slow_policy": args.slow_policy,
+            "seed": args.seed,
+            "python": sys.version.split()[0],
+        },
+        "results": [],
+    }
+    for transport_name in transports:
+        transport = TRANSPORTS[transport_name](args)
+        try:
+            for peers in peer_counts:
+                if peers < 2 or (transport_name == "direct" and peers != 2):
+                    continue
+                for size_name in size_names:
+                    sizes = SIZE_DISTRIBUTIONS[size_name]
+                    result = {"transport": transport_name, "peers": peers, "sizes": size_name}
+                    result["throughput"] = throughput(transport, peers, sizes, rng, corpus, args)
+                    result["latency_ms"] = latency(transport, peers, sizes, rng, corpus, args)
+                    report["results"].append(result)
+                    if args.verbose:
+                        print(f"{transport_name} with {peers} peers, {size_name} messages done", file=sys.stderr)
+        finally:
+            transport.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import argparse
+import resource
+import selectors
+import socket
+from collections import deque
+from itertools import islice
+
+from compression import MIN_COMPRESS, Compression, compress_once, hello
+from framing import FLAG_COMPRESSED, FLAG_CONTROL, FrameReader, encode_frame
+from history import History
+
+# ============================
+# CHAT HUB
+# ============================
+
+IOV_MAX = 1024  # Most buffers one sendmsg call takes on Linux
+SLOW_POLICIES = ("drop-oldest", "drop-newest", "disconnect")
+
+class Client:
+    """One connected peer: its socket, its frame reader and its outbound queue.
+
+    The queue holds the frames not yet written, shared with the other
+    recipients rather than copied; `offset` bytes of the first one are sent.
+    """
+
+    def __init__(self, sock, addr, read_size):
+        self.sock = sock
+        self.addr = addr
+        self.reader = FrameReader(read_size)
+        self.queue = deque()
+        self.queued_bytes = 0
+        self.offset = 0
+        self.dropped = 0  # Messages lost to the slow-consumer policy
+        self.compression = None  # Set once the client offers it
+        self.closed = False
+
+class ChatHub:
+    """A chat room: every message a client sends is relayed to all the others.
+
+    One thread multiplexes every socket through a selector (epoll on Linux), so
+    thousands of clients cost a file descriptor and a couple of buffers each
+    rather than a thread. Sockets are non-blocking: a message goes out at once
+    to every client whose socket has room and waits in the queue of the others.
+
+    Each message is encoded once and the same bytes object is queued for every
+    recipient. A queue is bounded by max_queue messages and max_queue_bytes;
+    when a slow client's queue is full, slow_policy decides what gives:
+      drop-oldest  discard its oldest queued messages (the default)
+      drop-newest  discard the new message for that client
+      disconnect   drop the client
+    Either way the other clients are never held up by it.
+
+    With compression on, a client that offers it (see compression.py) sends
+    compressed frames on its own stream and receives broadcasts compressed
+    once for all such clients, without a shared context.
+
+    Given a History, the hub records every broadcast in it and sends a newcomer
+    the recent messages in one vectored write as it joins.
+
+    Mirrors the socketserver API (serve_forever / shutdown / server_close).
+    Override joined, left and received to react to the room; post() sends a
+    message from another thread.
+    """
+
+    READ_SIZE = 16384  # Initial receive buffer per client
+    BACKLOG = 4096
+
+    def __init__(self, server_address, max_queue=1000, max_queue_bytes=1024 * 1024, slow_policy="drop-oldest",
+                 compression=True, history=None):
+        if slow_policy not in SLOW_POLICIES:
+            raise ValueError(f"slow_policy must be one of {', '.join(SLOW_POLICIES)}")
+        self.server_address = server_address
+        self.max_queue = max_queue
+        self.max_queue_bytes = max_queue_bytes
+        self.slow_policy = slow_policy
+        self.compression = compression
+        self.history = history
+        self.selector = selectors.DefaultSelector()
+        self.listener = socket.create_server(server_address, backlog=self.BACKLOG)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ, self.accept)
+
+        # Other threads wake the loop by writing to this socket pair
+        self.waker, self.wakeup = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wakeup.setblocking(False)
+        self.selector.register(self.wakeup, selectors.EVENT_READ, self.woken)
+        self.posted = deque()
+
+        self.clients = {}
+        self.running = False
+
+    # ---------- Event loop ----------
+
+    def serve_forever(self):
+        self.running = True
+        while self.running:
+            for key, events in self.selector.select():
+                if isinstance(key.data, Client):
+                    self.service(key.data, events)
+                else:
+                    key.data()
+
+    def shutdown(self):
+        self.running = False
+        self.wake()
+
+    def server_close(self):
+        for client in list(self.clients.values()):
+            self.drop(client)
+        self.selector.close()
+        self.listener.close()
+        self.waker.close()
+        self.wakeup.close()
+        if self.history is not None:
+            self.history.close()
+
+    def wake(self):
+        try:
+            self.waker.send(b"\0")
+        except BlockingIOError:
+            pass  # Already has a wakeup pending
+
+    def woken(self):
+        try:
+            while self.wakeup.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while self.posted:
+            self.broadcast(self.posted.popleft())
+
+    def post(self, payload):
+        """Broadcast payload to every client. Safe to call from any thread."""
+        self.posted.append(payload)
+        self.wake()
+
+    # ---------- Connections ----------
+
+    def accept(self):
+        while True:
+            try:
+                sock, addr = self.listener.accept()
+            except BlockingIOError:
+                return
+            except OSError:
+                return  # Out of file descriptors or similar; try again on the next event
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = Client(sock, addr, self.READ_SIZE)
+            self.clients[sock] = client
+            self.selector.register(sock, selectors.EVENT_READ, client)
+            self.replay(client)
+            if not client.closed:
+                self.joined(client)
+
+    def drop(self, client):
+        if client.closed:
+            return
+        client.closed = True
+        self.selector.unregister(client.sock)
+        del self.clients[client.sock]
+        client.sock.close()
+        self.left(client)
+
+    def service(self, client, events):
+        if events & selectors.EVENT_WRITE:
+            self.flush(client)
+        if events & selectors.EVENT_READ and not client.closed:
+            self.read(client)
+
+    def read(self, client):
+        try:
+            if not client.reader.read_from(client.sock):
+                self.drop(client)
+                return
+            for flags, payload in client.reader.frames():
+                if flags & FLAG_CONTROL:
+                    self.control(client, payload)
+                    continue
+                if flags & FLAG_COMPRESSED:
+                    if client.compression is None:
+                        raise ValueError("Compressed frame before compression was agreed")
+                    payload = client.compression.decode(payload)
+                self.received(client, payload)
+                if client.closed:
+                    return
+        except BlockingIOError:
+            pass
+        except (OSError, ValueError):
+            self.drop(client)
+
+    def control(self, client, payload):
+        """Answer a client's HELLO with ours, agreeing to compression if it's on."""
+        if not self.compression:
+            self.send(client, encode_frame(b"HELLO", FLAG_CONTROL))
+            return
+        client.compression = Compression(no_context=True)
+        client.compression.on_hello(payload)
+        self.send(client, hello(no_context=True))
+
+    def replay(self, client):
+        """Send a newcomer the history in one vectored write. Whatever the socket
+        doesn't take waits in the client's queue, outside its limits."""
+        if self.history is None or not self.history.count:
+            return
+        frames = self.history.frames()
+        client.queue.extend(frames)
+        client.queued_bytes += self.history.bytes
+        self.flush(client)
+        if client.queue and not client.closed:
+            self.selector.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    # ---------- Sending ----------
+
+    def broadcast(self, payload, sender=None):
+        """Send payload to every client except sender. The frame is encoded once,
+        and compressed once if any recipient takes compressed frames."""
+        frame = encode_frame(payload)
+        if self.history is not None:
+            self.history.append(frame)
+        compressed = None
+        for client in list(self.clients.values()):
+            if client is sender:
+                continue
+            if client.compression is not None and client.compression.enabled and len(payload) >= MIN_COMPRESS:
+                if compressed is None:
+                    data = compress_once(payload)
+                    compressed = encode_frame(data, FLAG_COMPRESSED) if len(data) < len(payload) else frame
+                self.send(client, compressed)
+            else:
+                self.send(client, frame)
+
+    def send(self, client, frame):
+        if client.closed:
+            return
+        if client.queue:
+            self.enqueue(client, frame)  # Keep the order behind what's already waiting
+            return
+        try:
+            sent = client.sock.send(frame)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.drop(client)
+            return
+        if sent < len(frame):
+            client.queue.append(frame)
+            client.queued_bytes += len(frame)
+            client.offset = sent
+            self.selector.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def enqueue(self, client, frame):
+        if len(client.queue) < self.max_queue and client.queued_bytes + len(frame) <= self.max_queue_bytes:
+            client.queue.append(frame)
+            client.queued_bytes += len(frame)
+            return
+        if self.slow_policy == "disconnect":
+            self.drop(client)
+            return
+        if self.slow_policy == "drop-newest":
+            client.dropped += 1
+            return
+
+        # drop-oldest, sparing a partly sent first frame so the stream stays aligned
+        head = client.queue.popleft() if client.offset else None
+        kept = 1 if head is not None else 0
+        while client.queue and (len(client.queue) + kept >= self.max_queue
+                                or client.queued_bytes + len(frame) > self.max_queue_bytes):
+            client.queued_bytes -= len(client.queue.popleft())
+            client.dropped += 1
+        if head is not None:
+            client.queue.appendleft(head)
+        client.queue.append(frame)
+        client.queued_bytes += len(frame)
+
+    def flush(self, client):
+        """Write as much of the queue as the socket takes, in one vectored send."""
+        buffers = list(islice(client.queue, IOV_MAX))
+        if client.offset:
+            buffers[0] = memoryview(buffers[0])[client.offset:]
+        try:
+            sent = client.sock.sendmsg(buffers) + client.offset
+        except BlockingIOError:
+            return
+        except OSError:
+            self.drop(client)
+            return
+        while client.queue and sent >= len(client.queue[0]):
+            sent -= len(client.queue[0])
+            client.queued_bytes -= len(client.queue.popleft())
+        client.offset = sent
+        if not client.queue:
+            self.selector.modify(client.sock, selectors.EVENT_READ, client)
+
+    # ---------- Hooks ----------
+
+    def joined(self, client):
+        pass
+
+    def left(self, client):
+        pass
+
+    def received(self, client, payload):
+        """payload is a memoryview into the client's receive buffer, valid during this call."""
+        self.broadcast(payload, sender=client)
+
+def raise_fd_limit():
+    """Each client holds a file descriptor; lift the soft limit to the hard one."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY:
+        hard = max(soft, 1 << 20)
+    try:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+# ============================
+# MAIN
+# ============================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a chat room that relays tcp-chat.py messages between many peers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--max-queue", type=int, default=1000, help="Messages queued per slow client")
+    parser.add_argument("--max-queue-bytes", type=int, default=1024 * 1024, help="Bytes queued per slow client")
+    parser.add_argument("--slow-policy", choices=SLOW_POLICIES, default="drop-oldest",
+                        help="What to do when a client's queue is full")
+    parser.add_argument("--no-compression", action="store_true", help="Turn down clients that offer compression")
+    parser.add_argument("--history", type=int, default=100, help="Recent messages replayed to newcomers (0 for none)")
+    parser.add_argument("--history-bytes", type=int, default=1024 * 1024, help="Most bytes of history kept in memory")
+    parser.add_argument("--history-file", help="Append messages that leave the history to this file")
+    parser.add_argument("--history-file-bytes", type=int, default=64 * 1024 * 1024,
+                        help="Start a new history file after this many bytes, keeping one old one")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    raise_fd_limit()
+    history = None
+    if args.history or args.history_file:
+        history = History(args.history, args.history_bytes, args.history_file, args.history_file_bytes)
+    hub = ChatHub((args.host, args.port), args.max_queue, args.max_queue_bytes, args.slow_policy,
+                  not args.no_compression, history)
+    print(f"[HUB LISTENING ON {args.host}:{args.port}]")
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    hub.server_close()
+    print("[HUB CLOSED]")
+
+if __name__ == "__main__":
+    main()
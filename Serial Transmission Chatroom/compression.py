@@ -0,0 +1,97 @@
+import zlib
+
+from framing import FLAG_COMPRESSED, FLAG_CONTROL, MAX_FRAME, encode_frame
+
+# ============================
+# NEGOTIATED COMPRESSION
+# ============================
+#
+# Off unless both ends agree. A peer that wants it sends a control frame
+#   HELLO deflate
+# right after connecting, and the other end answers with its own HELLO. Only a
+# HELLO from the other side turns compression on, so a peer that never sends
+# one (an older tcp-chat.py) is never sent a compressed or control frame.
+#
+# HELLO tokens:
+#   deflate     I can inflate compressed frames from you
+#   no-context  my compressed frames don't depend on each other (the hub sends
+#               this, so one compressed broadcast serves every client)
+#
+# A compressed frame carries raw deflate data flushed with Z_SYNC_FLUSH and the
+# trailing 00 00 ff ff removed, as in WebSocket permessage-deflate. Each
+# direction keeps one compression stream for the life of the connection, so a
+# message can refer back to everything sent before it, and both streams start
+# from a preset dictionary of common chat text, so even the first short
+# messages shrink. Messages under MIN_COMPRESS bytes are sent as they are.
+
+MIN_COMPRESS = 32
+LEVEL = 4  # Nearly level 6's ratio on chat text for a third of the time
+WBITS = -15  # Raw deflate: no zlib header or checksum per message
+SYNC_TAIL = b"\x00\x00\xff\xff"
+
+# Most useful strings last: zlib prefers matches closest to the data
+PRESET_DICTIONARY = (
+    b"https://www. .com .org .net http:// @gmail.com "
+    b"I don't know I'm not sure I think we should Let me know if you need anything "
+    b"Can you send me the file? I'll send it to you tomorrow morning. "
+    b"What time is the meeting? See you later! Good morning! Good night! "
+    b"Thank you so much! No problem. Sounds good to me. Are you there? "
+    b"yes no maybe ok okay sure thanks thank you please sorry lol haha :) :( :D "
+    b"the and that this with have from they will would there their what about "
+    b"which when make like time just know take people into year your good some "
+    b"could them other than then look only come over think also back after work "
+    b"hello hi hey how are you doing today? I'm fine, thanks. What's up? "
+)
+
+def compress_once(payload):
+    """Compress payload on its own (the no-context form), from the preset dictionary."""
+    compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS, zdict=PRESET_DICTIONARY)
+    return (compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-len(SYNC_TAIL)]
+
+def hello(no_context=False):
+    """A control frame offering compression."""
+    return encode_frame(b"HELLO deflate" + (b" no-context" if no_context else b""), FLAG_CONTROL)
+
+class Compression:
+    """One connection's compression state.
+
+    encode() is called by whoever sends and decode() by whoever receives, so
+    the two can live on different threads.
+    """
+
+    def __init__(self, no_context=False):
+        self.no_context = no_context  # Our compressed frames are independent
+        self.enabled = False  # The peer said it can inflate
+        self.peer_no_context = False
+        self.compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, WBITS, zdict=PRESET_DICTIONARY)
+        self.decompressor = zlib.decompressobj(WBITS, zdict=PRESET_DICTIONARY)
+
+    def on_hello(self, payload):
+        tokens = bytes(payload).split()
+        if tokens[:1] != [b"HELLO"]:
+            raise ValueError(f"Unknown control frame {bytes(payload[:32])!r}")
+        self.enabled = b"deflate" in tokens
+        self.peer_no_context = b"no-context" in tokens
+
+    def encode(self, payload):
+        """The frame to send payload in: compressed if the peer agreed and it's big enough."""
+        if not self.enabled or len(payload) < MIN_COMPRESS:
+            return encode_frame(payload)
+        if self.no_context:
+            data = compress_once(payload)
+        else:
+            data = (self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH))[:-len(SYNC_TAIL)]
+        return encode_frame(data, FLAG_COMPRESSED)
+
+    def decode(self, data):
+        """Inflate the payload of a compressed frame. ValueError if it's garbage or too big."""
+        decompressor = self.decompressor
+        if self.peer_no_context:
+            decompressor = zlib.decompressobj(WBITS, zdict=PRESET_DICTIONARY)
+        try:
+            payload = decompressor.decompress(bytes(data) + SYNC_TAIL, MAX_FRAME + 1)
+        except zlib.error as e:
+            raise ValueError(f"Bad compressed frame: {e}")
+        if len(payload) > MAX_FRAME or decompressor.unconsumed_tail:
+            raise ValueError(f"Compressed frame inflates past the {MAX_FRAME} byte limit")
+        return payload
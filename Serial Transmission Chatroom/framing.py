@@ -0,0 +1,87 @@
+import struct
+
+# ============================
+# FRAMING
+# ============================
+#
+# A frame is a 4-byte big-endian payload length followed by the payload, as
+# written by send_message in tcp-chat.py. Lengths never reach MAX_FRAME, so the
+# top two bits of the header are free for flags, which plain messages leave at 0.
+
+HEADER = struct.Struct("!I")
+MAX_FRAME = 16 * 1024 * 1024  # A bigger length means a broken or hostile peer
+FLAG_COMPRESSED = 0x80000000  # Payload is deflated (see compression.py)
+FLAG_CONTROL = 0x40000000  # Payload is for the connection, not the chat
+FLAGS = FLAG_COMPRESSED | FLAG_CONTROL
+
+def encode_frame(payload, flags=0):
+    return HEADER.pack(flags | len(payload)) + payload
+
+class FrameReader:
+    """Splits a socket's byte stream into frames.
+
+    Bytes are received with recv_into straight into one reusable buffer, and
+    every complete frame a read brought in is returned at once, its payload a
+    memoryview of that buffer, so a read costs one syscall and no copies however many
+    messages it held. A frame cut anywhere, even inside its header, waits in the
+    buffer for the rest. The buffer grows to fit a frame larger than itself and
+    shrinks back once that frame has been consumed.
+    """
+
+    def __init__(self, size=65536):
+        self.size = size
+        self.allocate(size)
+
+    def allocate(self, size):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # First byte not yet returned as a frame
+        self.end = 0  # End of the received bytes
+
+    def read_from(self, sock):
+        """recv_into the buffer once. Returns the byte count, 0 at end of stream."""
+        if self.start == self.end:
+            if len(self.buffer) > self.size:
+                self.allocate(self.size)  # Give back the room a big frame needed
+            self.start = self.end = 0
+        elif self.start + self.pending_size() > len(self.buffer) or self.end == len(self.buffer):
+            self.make_room()
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def frames(self):
+        """Yield (flags, payload) for each complete frame. The payload is a
+        memoryview, valid until the next read_from. Raises ValueError for a
+        frame over MAX_FRAME."""
+        while self.end - self.start >= HEADER.size:
+            header = HEADER.unpack_from(self.buffer, self.start)[0]
+            length = header & ~FLAGS
+            if length > MAX_FRAME:
+                raise ValueError(f"Frame of {length} bytes is over the {MAX_FRAME} byte limit")
+            payload_start = self.start + HEADER.size
+            if payload_start + length > self.end:
+                return
+            self.start = payload_start + length
+            yield header & FLAGS, self.view[payload_start:self.start]
+
+    def pending_size(self):
+        """Bytes the partial frame at start will take once complete."""
+        if self.end - self.start < HEADER.size:
+            return HEADER.size
+        return HEADER.size + (HEADER.unpack_from(self.buffer, self.start)[0] & ~FLAGS)
+
+    def make_room(self):
+        """Move the partial frame to the front, into a bigger buffer if it won't fit."""
+        pending = self.end - self.start
+        needed = self.pending_size()
+        if needed > HEADER.size + MAX_FRAME:
+            raise ValueError(f"Frame of {needed - HEADER.size} bytes is over the {MAX_FRAME} byte limit")
+        if needed > len(self.buffer):
+            old = self.view[self.start:self.end]
+            self.allocate(max(needed, len(self.buffer) * 2))
+            self.view[:pending] = old
+        else:
+            self.view[:pending] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = pending
@@ -0,0 +1,88 @@
+import os
+
+from framing import FLAGS, HEADER
+
+# ============================
+# CHAT HISTORY
+# ============================
+
+class History:
+    """The most recent chat messages, kept as the frames they were broadcast in,
+    so a newcomer can be sent them as they are.
+
+    A fixed array of `capacity` slots is used as a ring, and at most max_bytes
+    of frames are held, so memory stays constant however long the room runs.
+    Frames pushed out of the ring are appended to spill_path if one is given.
+    That segment file is append-only and in wire format; once it reaches
+    spill_max_bytes it is renamed to spill_path + ".1" and a new one started,
+    so disk use is bounded as well.
+    """
+
+    def __init__(self, capacity=100, max_bytes=1024 * 1024, spill_path=None, spill_max_bytes=64 * 1024 * 1024):
+        self.slots = [None] * capacity
+        self.first = 0  # Slot of the oldest frame
+        self.count = 0
+        self.bytes = 0
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.spill = open(spill_path, 'ab') if spill_path else None
+
+    def append(self, frame):
+        while self.count and (self.count == len(self.slots) or self.bytes + len(frame) > self.max_bytes):
+            self.evict()
+        if len(frame) > self.max_bytes or not self.slots:
+            self.write_spill(frame)  # Too big to keep in memory at all
+            return
+        self.slots[(self.first + self.count) % len(self.slots)] = frame
+        self.count += 1
+        self.bytes += len(frame)
+
+    def evict(self):
+        frame = self.slots[self.first]
+        self.slots[self.first] = None
+        self.first = (self.first + 1) % len(self.slots)
+        self.count -= 1
+        self.bytes -= len(frame)
+        self.write_spill(frame)
+
+    def write_spill(self, frame):
+        if self.spill is None:
+            return
+        if self.spill.tell() and self.spill.tell() + len(frame) > self.spill_max_bytes:
+            self.spill.close()
+            os.replace(self.spill_path, self.spill_path + ".1")
+            self.spill = open(self.spill_path, 'ab')
+        self.spill.write(frame)
+
+    def frames(self):
+        """The frames in memory, oldest first."""
+        end = self.first + self.count
+        if end <= len(self.slots):
+            return self.slots[self.first:end]
+        return self.slots[self.first:] + self.slots[:end - len(self.slots)]
+
+    def spilled(self):
+        """Yield the payloads of the spilled frames, oldest first, reading one at a time."""
+        if self.spill is None:
+            return
+        self.spill.flush()
+        for path in (self.spill_path + ".1", self.spill_path):
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                while True:
+                    header = f.read(HEADER.size)
+                    if len(header) < HEADER.size:
+                        break
+                    length = HEADER.unpack(header)[0] & ~FLAGS
+                    payload = f.read(length)
+                    if len(payload) < length:
+                        break  # Cut short by a crash
+                    yield payload
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close()
@@ -1,6 +1,7 @@
 import socket
 import struct
 import threading
+import time
 import zlib
 
 # ============================
@@ -17,7 +18,18 @@ if not DESTINATION_ADDRESS:
     SOURCE_ID = 2
     DESTINATION_ID = 1
 
-seq = 0
+seq = 0  # Numbers messages; every fragment of a message carries the same one
+
+# Largest IP packet the link carries. Messages are cut into fragments that fit
+# in one packet each, so nothing is fragmented again at the IP layer.
+MTU = 1500
+IP_HEADER_SIZE = 20
+REASSEMBLY_TIMEOUT = 5.0  # Seconds to wait for the missing fragments of a message
+
+# Header: source id, destination id, message seq, fragment index, fragment
+# count, payload length, CRC-32 of the rest of the header and the payload
+HEADER = struct.Struct("!HHHHHHI")
+MAX_PAYLOAD = MTU - IP_HEADER_SIZE - HEADER.size
 
 # ============================
 # PACKET CLASS
@@ -25,48 +37,87 @@ seq = 0
 
 class Packet:
     def __init__(self, *args):
-        if len(args) == 4:
-            # Called as Packet(s_id, d_id, seq, msg) → Sender
-            s_id, d_id, seq, msg = args
+        if len(args) == 6:
+            # Called as Packet(s_id, d_id, seq, frag, total, msg) → Sender
+            s_id, d_id, seq, frag, total, msg = args
             self.s_id = s_id
             self.d_id = d_id
             self.seq = seq
-            self.msg_len = len(msg)
+            self.frag = frag
+            self.total = total
 
             # Ensure msg is in byte format
             if isinstance(msg, str):
                 msg = msg.encode()
 
             self.msg = msg
+            self.msg_len = len(msg)
             self.checksum = self.calculate_checksum()
 
         else:
             # Called as Packet(packet) → Receiver
             packet = args[0]
-            header = packet[:8]
-            payload = packet[8:9]  # Only 1 byte for the message
-
-            self.s_id, self.d_id, self.seq, self.msg_len, self.checksum = struct.unpack("!HHHBB", header)
-            self.msg = payload
+            (self.s_id, self.d_id, self.seq, self.frag, self.total,
+             self.msg_len, self.checksum) = HEADER.unpack_from(packet)
+            self.msg = packet[HEADER.size:HEADER.size + self.msg_len]
 
     def calculate_checksum(self):
-        return zlib.crc32(self.msg) & 0xFF  # CRC-8
+        """CRC-32 of the header (with the checksum field zeroed) and the payload."""
+        header = HEADER.pack(self.s_id, self.d_id, self.seq, self.frag, self.total, self.msg_len, 0)
+        return zlib.crc32(self.msg, zlib.crc32(header))
 
     def get_header(self):
-        return struct.pack("!HHHBB", self.s_id, self.d_id, self.seq, self.msg_len, self.checksum)
+        return HEADER.pack(self.s_id, self.d_id, self.seq, self.frag, self.total, self.msg_len, self.checksum)
 
     def send_to(self, addr):
-        s = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_UDP)  # Use UDP for better compatibility
         packet = self.get_header() + self.msg
-        print("packet: ", packet)
-        s.sendto(packet, (addr, 0))
+        if SHOW_LOGS:
+            print("packet: ", packet)
+        s_send.sendto(packet, (addr, 0))
 
     def is_valid(self):
-        """Validate checksum"""
-        return self.checksum == (zlib.crc32(self.msg) & 0xFF)
+        """Validate length, fragment numbering and checksum"""
+        return (len(self.msg) == self.msg_len and self.frag < self.total
+                and self.checksum == self.calculate_checksum())
 
     def __str__(self):
-        return f"[Packet] From {self.s_id} → {self.d_id}, Seq {self.seq}, Msg {self.msg.decode() if self.is_valid() else '[CORRUPTED]'}"
+        return (f"[Packet] From {self.s_id} → {self.d_id}, Seq {self.seq}, Fragment {self.frag + 1}/{self.total}, "
+                f"{self.msg_len} bytes{'' if self.is_valid() else ' [CORRUPTED]'}")
+
+def fragment(s_id, d_id, seq, data):
+    """Cut a message into packets of at most MAX_PAYLOAD bytes each."""
+    chunks = [data[i:i + MAX_PAYLOAD] for i in range(0, len(data), MAX_PAYLOAD)] or [b""]
+    if len(chunks) > 0xFFFF:
+        raise ValueError(f"Message too long: over {0xFFFF} fragments of {MAX_PAYLOAD} bytes")
+    return [Packet(s_id, d_id, seq, frag, len(chunks), chunk) for frag, chunk in enumerate(chunks)]
+
+# ============================
+# REASSEMBLY
+# ============================
+
+partial = {}  # (s_id, seq, total) → [deadline, {frag: payload}]
+
+def reassemble(packet):
+    """Collect a fragment. Returns the whole message once all of its fragments arrived."""
+    if packet.total == 1:
+        return packet.msg
+
+    # Give up on messages that lost a fragment
+    now = time.monotonic()
+    for key in [key for key, (deadline, _) in partial.items() if deadline < now]:
+        del partial[key]
+
+    # Keyed on the fragment count too, so a fragment that disagrees about it
+    # can't leave a gap in another message's numbering
+    key = (packet.s_id, packet.seq, packet.total)
+    if packet.frag >= packet.total:
+        return None
+    deadline, fragments = partial.setdefault(key, [now + REASSEMBLY_TIMEOUT, {}])
+    fragments[packet.frag] = packet.msg  # A duplicate just replaces itself
+    if len(fragments) < packet.total:
+        return None
+    del partial[key]
+    return b"".join(fragments[i] for i in range(packet.total))
 
 # ============================
 # RECEIVER FUNCTION
@@ -77,7 +128,12 @@ def receiver():
     s_receive = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_UDP)
 
     while True:
-        packet, addr = s_receive.recvfrom(1024)
+        packet, addr = s_receive.recvfrom(65535)
+
+        # Raw sockets hand us the IP header too; ours starts after it
+        packet = packet[(packet[0] & 0x0F) * 4:]
+        if len(packet) < HEADER.size:
+            continue
 
         # Process incoming packet
         processed_packet = Packet(packet)
@@ -89,15 +145,20 @@ def receiver():
         if SHOW_LOGS:
             print(processed_packet)
 
-        if processed_packet.is_valid():
-            print(f"[RECEIVED] {processed_packet.msg.decode()} from {processed_packet.s_id}")
-        else:
+        if not processed_packet.is_valid():
             print("[ERROR] Packet corrupted!")
+            continue
+
+        message = reassemble(processed_packet)
+        if message is not None:
+            print(f"[RECEIVED] {message.decode(errors='replace')} from {processed_packet.s_id}")
 
 # ============================
 # START RECEIVER THREAD
 # ============================
 
+s_send = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_UDP)  # Use UDP for better compatibility
+
 receiver_thread = threading.Thread(target=receiver, daemon=True)
 receiver_thread.start()
 
@@ -108,19 +169,14 @@ receiver_thread.start()
 while True:
     message = input("> ")
 
-    # SEND THE START MESSAGE
-    p = Packet(SOURCE_ID, DESTINATION_ID, seq, b'\x02')  # Use STX (Start of Text)
-    p.send_to(DESTINATION_ADDRESS)
-    seq += 1
-
-    # SEND MESSAGE BYTE BY BYTE
-    for c in message:
-        p = Packet(SOURCE_ID, DESTINATION_ID, seq, c)
-        print(p)
+    # SEND THE MESSAGE IN AS FEW PACKETS AS THE MTU ALLOWS
+    try:
+        packets = fragment(SOURCE_ID, DESTINATION_ID, seq, message.encode())
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        continue
+    for p in packets:
+        if SHOW_LOGS:
+            print(p)
         p.send_to(DESTINATION_ADDRESS)
-        seq += 1
-
-    # SEND THE END MESSAGE
-    p = Packet(SOURCE_ID, DESTINATION_ID, seq, b'\x03')  # Use ETX (End of Text)
-    p.send_to(DESTINATION_ADDRESS)
-    seq += 1
\ No newline at end of file
+    seq = (seq + 1) % 0x10000
\ No newline at end of file
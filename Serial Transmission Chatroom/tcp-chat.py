@@ -1,34 +1,84 @@
 import socket
-from threading import Thread
+from threading import Lock, Thread
+
+from chathub import ChatHub, raise_fd_limit
+from compression import Compression, hello
+from framing import FLAG_COMPRESSED, FLAG_CONTROL, FrameReader
+from history import History
 
 # CONFIG
 PORT = int(input("Target port: "))
 DESTINATION_ADDRESS = input("Target address (xxx.xxx.xxx.xxx, leave empty to wait for connection): ") or None
+HUB_MODE = not DESTINATION_ADDRESS and input("Host a room for many peers? (y/n): ").strip().lower() == "y"
+# Only offer compression to peers running this version: older ones can't read the offer
+COMPRESS = bool(DESTINATION_ADDRESS) and input("Compress messages? (y/n): ").strip().lower() == "y"
 LOCAL_ADDRESS = ('0.0.0.0', PORT)
 
+compression = Compression()  # Stays off unless the peer agrees to it
+send_lock = Lock()  # The receive thread answers compression offers
+
 # HELPER FUNCTION TO SEND MESSAGES WITH A HEADER
 def send_message(sock, msg):
-    msg = msg.encode()
-    length = len(msg).to_bytes(4, 'big')  # 4-byte header indicating length
-    sock.sendall(length + msg)  # Send length + actual message
+    with send_lock:
+        sock.sendall(compression.encode(msg.encode()))  # 4-byte length header + actual message
 
 # RECEIVE FUNCTION
 def handle_receive(sock):
+    reader = FrameReader()  # Reassembles messages split or merged by TCP
     while True:
         try:
-            # Read message length first
-            length_data = sock.recv(4)
-            if not length_data:
+            if not reader.read_from(sock):
                 print("[DISCONNECTED]")
                 break
 
-            msg_length = int.from_bytes(length_data, 'big')  # Convert bytes to int
-            message = sock.recv(msg_length).decode()  # Receive the full message
-
-            print("\n[RECEIVED]:", message, "\n> ", end="")
+            # Every complete message that arrived with this read
+            for flags, message in reader.frames():
+                if flags & FLAG_CONTROL:
+                    compression.on_hello(message)
+                    if not DESTINATION_ADDRESS:
+                        with send_lock:
+                            sock.sendall(hello())  # Answer the offer
+                    continue
+                if flags & FLAG_COMPRESSED:
+                    message = compression.decode(message)
+                print("\n[RECEIVED]:", str(message, 'utf-8', 'replace'), "\n> ", end="")
         except ConnectionResetError:
             print("[Connection closed by peer]")
             break
+        except ValueError as e:
+            print(f"[Bad message from peer: {e}]")
+            break
+
+# HUB MODE: RELAY BETWEEN ANY NUMBER OF PEERS
+class HostHub(ChatHub):
+    def joined(self, client):
+        print(f"\n[PEER CONNECTED: {client.addr}] ({len(self.clients)} in the room)\n> ", end="")
+
+    def left(self, client):
+        print(f"\n[PEER DISCONNECTED: {client.addr}] ({len(self.clients)} in the room)\n> ", end="")
+
+    def received(self, client, payload):
+        super().received(client, payload)
+        print(f"\n[RECEIVED from {client.addr[0]}]:", str(payload, 'utf-8', 'replace'), "\n> ", end="")
+
+if HUB_MODE:
+    raise_fd_limit()
+    hub = HostHub(LOCAL_ADDRESS, history=History(100))  # Newcomers see the last 100 messages
+    print(f"[ROOM OPEN ON PORT {PORT}]")
+    t1 = Thread(target=hub.serve_forever, daemon=True)
+    t1.start()
+
+    while True:
+        msg = input("> ")
+        if msg.lower() == "exit":
+            break
+        hub.post(msg.encode())
+
+    hub.shutdown()
+    t1.join()
+    hub.server_close()
+    print("[ROOM CLOSED]")
+    raise SystemExit
 
 # INITIALIZE SOCKET
 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -37,6 +87,8 @@ if DESTINATION_ADDRESS:
     # Connecting as a client
     sock.connect((DESTINATION_ADDRESS, PORT))
     print("[CONNECTED TO PEER]")
+    if COMPRESS:
+        sock.sendall(hello())
 else:
     # Waiting for incoming connection as server
     sock.bind(LOCAL_ADDRESS)